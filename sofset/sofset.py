@@ -13,6 +13,11 @@ in the Excel file, and that there is exactly five data points available
 for each cross section.
 These restrictions are to be controlled via the Excel sheet.
 
+Only numpy and the standard library are imported when the module is
+loaded. SciPy, pandas, openpyxl and matplotlib are imported inside the
+functions that need them, so a run without plots never loads matplotlib
+and the script starts quickly when invoked from Teddy.
+
 Todo
 -----
 * Create possibility for choosing load type for each load case
@@ -21,19 +26,342 @@ Todo
 
 '''
 
+__version__ = '0.2.2'
+
+import glob
+import gzip
+import hashlib
+import io
+import json
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
 import numpy as np
-import pandas as pd
 import os
-# import sys
-from scipy.interpolate import griddata
-from scipy.interpolate import interp1d
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D     # noqa
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from multiprocessing import shared_memory
+
+# Functions called with the record of every finished stage, see `stage`
+_stage_hooks = []
+
+
+def add_stage_hook(hook):
+    '''Register `hook` to be called with the record of every stage.
+
+    A record is a dict with the keys 'stage' (name), 'wall_time' (seconds),
+    'rss' (resident memory of the process at the end of the stage, bytes),
+    'rss_change' (change of 'rss' during the stage, bytes),
+    'process_peak_rss' (peak resident memory of the process so far, bytes),
+    'pid' and any counts describing the stage, e.g. 'n_nodes',
+    'n_load_cases' or 'load_case'. The memory values are `None` if they
+    cannot be determined on the platform.
+    '''
+    _stage_hooks.append(hook)
+
+
+def remove_stage_hook(hook):
+    '''Unregister a hook added by `add_stage_hook`.'''
+    _stage_hooks.remove(hook)
+
+
+@contextmanager
+def stage(name, **info):
+    '''
+    Context manager timing a stage of a run.
+
+    When the stage finishes, its record is passed to all registered stage
+    hooks. The dict of counts is yielded, so counts that are only known
+    inside the stage can be added to it.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, e.g. 'read_excel_nodes' or 'write_datfile'.
+    **info
+        Counts describing the stage, e.g. `n_nodes=1000`.
+    '''
+    start = time.perf_counter()
+    rss_start = current_rss()
+    try:
+        yield info
+    finally:
+        rss = current_rss()
+        rss_change = None if rss is None or rss_start is None \
+            else rss - rss_start
+        record = dict(stage=name, wall_time=time.perf_counter() - start,
+                      rss=rss, rss_change=rss_change,
+                      process_peak_rss=peak_rss(), pid=os.getpid(), **info)
+        for hook in list(_stage_hooks):
+            hook(record)
+
+
+def peak_rss():
+    '''Return the peak resident memory of this process so far in bytes.
+
+    This is the high-water mark of the whole process, not of a stage.
+    Returns `None` if it cannot be determined on the platform.
+    '''
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        counters = _memory_counters_windows()
+        return None if counters is None else counters.PeakWorkingSetSize
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss():
+    '''Return the current resident memory of this process in bytes.
+
+    Returns `None` if it cannot be determined on the platform (macOS).
+    '''
+    if sys.platform == 'win32':
+        counters = _memory_counters_windows()
+        return None if counters is None else counters.WorkingSetSize
+
+    try:
+        # Resident pages are the second field
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _memory_counters_windows():
+    '''Return the memory counters of this process on Windows.'''
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+                process, ctypes.byref(counters), counters.cb):
+            return counters
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+class RunReport:
+    '''
+    Collection of stage records from a run.
+
+    While the report is used as a context manager it is registered as a
+    stage hook, so it records every stage that finishes in the meantime,
+    including stages in the readers.
+    '''
+
+    def __init__(self):
+        self.records = []
+        self._depth = 0
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        if self._depth == 0:
+            add_stage_hook(self)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            remove_stage_hook(self)
+
+    def write_json(self, file_name, **metadata):
+        '''Write the records and `metadata` to a JSON file.'''
+        report = dict(metadata, stages=self.records)
+        with open(file_name, 'w') as file:
+            json.dump(report, file, indent=2, default=_json_default)
+
+    def summary(self):
+        '''
+        Return a table of the stages with their total wall time, the largest
+        memory increase during one of them and the process peak memory when
+        they ended.
+        '''
+        totals = {}
+        for record in self.records:
+            count, wall_time, change, peak = totals.get(record['stage'],
+                                                        (0, 0, 0, 0))
+            totals[record['stage']] = (
+                count + 1, wall_time + record['wall_time'],
+                max(change, record['rss_change'] or 0),
+                max(peak, record['process_peak_rss'] or 0))
+
+        lines = ['    Stage                        Count   Time [s]  '
+                 'RSS change [MB]  Peak RSS [MB]']
+        for name, (count, wall_time, change, peak) in totals.items():
+            lines.append(f'    {name:<28} {count:>5} {wall_time:>10.3f} '
+                         f'{change / 2**20:>16.1f} {peak / 2**20:>14.1f}')
+        return '\n'.join(lines)
+
+
+def _json_default(obj):
+    '''Convert numpy scalars and arrays for JSON serialization.'''
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    return str(obj)
+
+
+# Input file formats by file extension
+_file_formats = {'.xlsx': 'excel', '.xlsm': 'excel', '.csv': 'csv',
+                 '.parquet': 'parquet', '.npy': 'npy', '.npz': 'npz'}
+
+
+def file_format(file_name):
+    '''
+    Return the format of an input file from its extension.
+
+    Returns one of 'excel', 'csv', 'parquet', 'npy' or 'npz'.
+    '''
+    ext = os.path.splitext(file_name)[1].lower()
+    try:
+        return _file_formats[ext]
+    except KeyError:
+        raise ValueError(
+            f'''Unsupported file format "{ext}" of {file_name}. Supported
+            formats are {", ".join(_file_formats)}.''') from None
+
+
+# Parsed input sheets from this session, keyed by absolute file path
+_sheet_cache = {}
+
+
+def read_sheet(file_name, sheet_name):
+    '''
+    Return all cell values of an input sheet as a 2D object array.
+
+    The sheet is parsed once and the values are cached for the rest of the
+    session, as long as the path, modification time and size of the file
+    are unchanged. Empty cells are `None`, and trailing rows without any
+    values are removed.
+
+    Besides Excel workbooks (.xlsx or .xlsm), the sheet can be given as a
+    CSV file (e.g. saved from Excel), a Parquet file or a 2D array in a
+    .npy file or under the key 'values' in a .npz file. These hold the
+    cells of the sheet only, so `sheet_name` is ignored for them. Text
+    cells holding numbers are read as numbers, like Excel does.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of file to read, including file extention (.xlsx, .xlsm, .csv,
+        .parquet, .npy or .npz).
+    sheet_name : str
+        Name of sheet to read in the Excel file.
+
+    Returns
+    -------
+    numpy array
+        Cell values with dtype object, indexed as [row, column] from the
+        upper left cell (A1) of the sheet.
+    '''
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size, sheet_name)
+
+    # Reuse values from this session if the file has not changed
+    cached = _sheet_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    fmt = file_format(path)
+
+    with stage('read_sheet', file=path, format=fmt) as info:
+        if fmt == 'excel':
+            import openpyxl
+
+            wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+            try:
+                rows = list(wb[sheet_name].iter_rows(values_only=True))
+            finally:
+                wb.close()
+        else:
+            rows = [[_cell_value(value) for value in row]
+                    for row in _read_table_rows(path, fmt)]
+        info['n_rows'] = len(rows)
+
+    # Remove trailing empty rows
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+
+    # Pad rows to equal length and store in one array
+    n_cols = max((len(row) for row in rows), default=0)
+    values = np.full((len(rows), n_cols), None, dtype=object)
+    for i, row in enumerate(rows):
+        values[i, :len(row)] = row
+
+    _sheet_cache[path] = (signature, values)
+    return values
+
+
+def _read_table_rows(path, fmt):
+    '''Return the rows of a sheet stored in a non-Excel file format.'''
+    if fmt == 'csv':
+        import csv
+
+        with open(path, newline='') as file:
+            return list(csv.reader(file))
+
+    if fmt == 'parquet':
+        import pandas as pd
+
+        return pd.read_parquet(path).astype(object).values.tolist()
+
+    if fmt == 'npy':
+        return np.load(path, allow_pickle=False).tolist()
+
+    with np.load(path, allow_pickle=False) as data:
+        return data['values'].tolist()
+
+
+def _cell_value(value):
+    '''Return a cell value read from a text or array file as from Excel.'''
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        for convert in [int, float]:
+            try:
+                value = convert(value)
+                break
+            except ValueError:
+                pass
+    if isinstance(value, float) and np.isnan(value):
+        # Empty cell
+        return None
+    return value
 
 
 def read_known_settlements(file_name, skiprows, load_case_dict,
                            points_per_section=5,
-                           sheet_name='known_settlement_values'):
+                           sheet_name='known_settlement_values',
+                           compact=False, dtype=np.float64):
     '''
     Return dictionary with known settlement points included.
 
@@ -43,7 +371,9 @@ def read_known_settlements(file_name, skiprows, load_case_dict,
     Parameters
     ----------
     filename : str
-        Name of Excel file where known settlement points are stored.
+        Name of Excel file where known settlement points are stored. The
+        sheet can also be given in one of the other formats supported by
+        `read_sheet`.
     skiprows : int
         Number of rows to skip when reading the Excel file.
     load_case_dict : dict
@@ -54,10 +384,17 @@ def read_known_settlements(file_name, skiprows, load_case_dict,
         to 5.
     sheet_name : str
         Name of sheet to read in the Excel file.
+    compact : bool, optional
+        Whether to return a `LoadCaseSet` storing the known points once for
+        all load cases, instead of updating `load_case_dict`. Defaults to
+        `False`.
+    dtype : numpy dtype, optional
+        Data type of the known settlements with `compact`, e.g. float32 to
+        halve their memory. Defaults to float64.
 
     Returns
     -------
-    dict
+    dict or LoadCaseSet
         Dictionary including point coordinates with known (or prescribed)
         settlement values along with the actual settlement values.
 
@@ -71,18 +408,34 @@ def read_known_settlements(file_name, skiprows, load_case_dict,
         raise Exception('''Arg points_per_section is currently only allowed to
      be 5''')
 
+    # Read the whole sheet once and slice out the values below the header
+    values = read_sheet(file_name, sheet_name)
+    data = values[skiprows+1:]
+
     # Extract X-and Y-coordinates of sections
-    x = pd.read_excel(file_name, sheet_name=sheet_name, skiprows=skiprows,
-                      usecols=[1]).values.flatten()
-    y = pd.read_excel(file_name, sheet_name=sheet_name, skiprows=skiprows,
-                      usecols=[2, 3, 4, 5, 6]).values.flatten()
+    x = data[:, 1].astype(float)
+    y = data[:, 2:7].astype(float).flatten()
 
     # Get indices where values are not NaN in the array of y-coordinates
     idx_no_nan = np.where(~np.isnan(y))
 
     n = points_per_section
 
+    # Load case numbers in the header, used to locate each load case column
+    lc_header = list(values[skiprows-2])
+
+    if compact:
+        # Store the known points once, the settlements are filled in below
+        load_case_set = LoadCaseSet(
+            load_case_dict, x, np.repeat(x, points_per_section)[idx_no_nan],
+            y[idx_no_nan], dtype=dtype)
+
     for i, lc in enumerate(load_case_dict.keys()):
+        if compact:
+            load_case_set[lc]['Z'] = _known_settlements(
+                data, lc_header, lc, i, load_case_dict[lc]['int_method'],
+                idx_no_nan, n)
+            continue
 
         # Insert Y-array for load case
         load_case_dict[lc]['Y'] = y[idx_no_nan]
@@ -90,42 +443,464 @@ def read_known_settlements(file_name, skiprows, load_case_dict,
         # Extract string describing interpolation method for given load case
         int_method = load_case_dict[lc]['int_method']
 
-        # Create the list specifying which columns to take from the Excel
-        # sheet for creating dataframe. If load case is 1D, take only the
-        # first row, otherwise take the next four rows.
-        row1 = 7 + n*i
-        cols = [row1] if '1D' in int_method else [row1, row1+1, row1+2, row1+3,
-                                                  row1+4]
-
-        # Read the columns from Excel file into dataframe
-        df_temp = pd.read_excel(file_name, sheet_name=sheet_name,
-                                skiprows=skiprows, usecols=cols)
-
-        # Extract settlements (here denoted Z suffixed by the load case number)
-        if '1D' in int_method:
-            # In 1D case, take all values as flattened array
-            load_case_dict[lc]['Z'] = df_temp.values.flatten()
+        # Extract settlements (here denoted Z)
+        load_case_dict[lc]['Z'] = _known_settlements(
+            data, lc_header, lc, i, int_method, idx_no_nan, n)
 
+        if _dimension(int_method) == '1d':
             # Store X-coordinates of sections in main dict
             load_case_dict[lc]['X'] = x
+        else:
+            # Repeat all X-values 'points_per_section' times and keep those
+            # with valid Y-values
+            load_case_dict[lc]['X'] = np.repeat(x, points_per_section)[
+                idx_no_nan]
 
-        elif '2D' in int_method:
-            # In 2D case take only values that have valid Y-values associated
-            # as flattened array. Valid values has corresponding value in the
-            # Y-array that are not nan
-            load_case_dict[lc]['Z'] = df_temp.values.flatten()[idx_no_nan]
+    return load_case_set if compact else load_case_dict
 
-            # Repeat all X-values 'points_per_section' times
-            x_temp = np.repeat(x, points_per_section)
 
-            # Save x-coordinates in dict
-            load_case_dict[lc]['X'] = x_temp[idx_no_nan]
+def _known_settlements(data, lc_header, lc, i, int_method, idx_no_nan, n):
+    '''
+    Return the known settlements of load case `lc` in the sheet data.
 
-    return load_case_dict
+    A 1D load case has one column of settlements, a 2D load case five, of
+    which only the values with valid Y-values (`idx_no_nan`) are kept.
+    '''
+    # First column of the load case
+    row1 = lc_header.index(lc) if lc in lc_header else 7 + n*i
+    if _dimension(int_method) == '1d':
+        return data[:, row1].astype(float)
+    return data[:, row1:row1+5].astype(float).flatten()[idx_no_nan]
+
+
+class LoadCase(Mapping):
+    '''
+    Load case in a `LoadCaseSet`.
+
+    Supports the dict-style access of the load cases in the master
+    dictionary, i.e. the keys 'title', 'int_method', 'X', 'Y' and 'Z', as
+    a view on the arrays of the set. 'X' and 'Y' are shared by all load
+    cases and read-only, 'Z' is a read-only row of the settlement matrix
+    and is changed by assigning to `load_case['Z']`.
+    '''
+    __slots__ = ('number', 'title', 'int_method', 'dim', 'row', '_set')
+
+    _keys = ('title', 'int_method', 'X', 'Y', 'Z')
+
+    def __init__(self, load_case_set, number, title, int_method, dim, row):
+        self._set = load_case_set
+        self.number = number
+        self.title = title
+        self.int_method = int_method
+        self.dim = dim
+        self.row = row
+
+    def __getitem__(self, key):
+        if key in ('title', 'int_method'):
+            return getattr(self, key)
+        if key == 'X':
+            return self._set.x_sections if self.dim == '1d' \
+                else self._set.x_known
+        if key == 'Y':
+            return self._set.y_known
+        if key == 'Z':
+            z = self._set.z[self.dim][self.row]
+            z.flags.writeable = False
+            return z
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'title':
+            self.title = value
+        elif key == 'Z':
+            self._set.z[self.dim][self.row] = value
+        elif key == 'int_method' and _dimension(value) == self.dim:
+            self.int_method = value
+        else:
+            raise KeyError(f'''{key!r} of load case {self.number} can not be
+            changed in a LoadCaseSet.''')
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return (f'LoadCase({self.number!r}, title={self.title!r}, '
+                f'int_method={self.int_method!r})')
+
+
+class LoadCaseSet(Mapping):
+    '''
+    Compact master dictionary of load cases sharing the same known points.
+
+    In the master dictionary from `read_known_settlements`, every load
+    case holds its own copy of the X- and Y-coordinates of the known
+    points. A `LoadCaseSet` stores the coordinates once, and the known
+    settlements of all 1D and of all 2D load cases in one contiguous
+    matrix each, with a row per load case. It can be used wherever the
+    master dictionary is used, as `load_case_set[lc]['Z']` etc. work the
+    same, see `LoadCase`.
+
+    Parameters
+    ----------
+    load_case_dict : dict
+        Titles and interpolation methods of the load cases, see
+        `load_cases`.
+    x_sections : numpy array
+        X-coordinates of the sections, the known points of 1D load cases.
+    x_known, y_known : numpy array
+        Coordinates of the known points of 2D load cases.
+    dtype : numpy dtype, optional
+        Data type of the settlement matrices. Defaults to float64.
+
+    Attributes
+    ----------
+    z : dict
+        Settlement matrix of the '1d' and the '2d' load cases. The known
+        settlements are nan until they are set.
+    '''
+
+    def __init__(self, load_case_dict, x_sections, x_known, y_known,
+                 dtype=np.float64):
+        self.x_sections = _read_only(x_sections)
+        self.x_known = _read_only(x_known)
+        self.y_known = _read_only(y_known)
+
+        # Assign each load case a row in the matrix of its dimension
+        self._load_cases = {}
+        rows = dict.fromkeys(['1d', '2d'], 0)
+        for lc, data in load_case_dict.items():
+            dim = _dimension(data['int_method'])
+            self._load_cases[lc] = LoadCase(self, lc, data['title'],
+                                            data['int_method'], dim, rows[dim])
+            rows[dim] += 1
+
+        self.z = {
+            '1d': np.full((rows['1d'], len(self.x_sections)), np.nan, dtype),
+            '2d': np.full((rows['2d'], len(self.x_known)), np.nan, dtype)}
+
+    def __getitem__(self, lc):
+        return self._load_cases[lc]
+
+    def __iter__(self):
+        return iter(self._load_cases)
+
+    def __len__(self):
+        return len(self._load_cases)
+
+    @property
+    def nbytes(self):
+        '''Number of bytes held by the coordinate and settlement arrays.'''
+        return sum(arr.nbytes for arr in [self.x_sections, self.x_known,
+                                          self.y_known, *self.z.values()])
+
+    def to_dict(self):
+        '''Return the load cases as a master dictionary of plain dicts.'''
+        return {lc: {key: load_case[key] if key in ('title', 'int_method')
+                     else np.array(load_case[key], dtype=float)
+                     for key in load_case}
+                for lc, load_case in self.items()}
+
+
+def _dimension(int_method):
+    '''Return '1d' or '2d' from the interpolation method of a load case.'''
+    int_method = int_method.lower()
+    if '1d' in int_method:
+        return '1d'
+    if '2d' in int_method:
+        return '2d'
+    raise Exception(
+        f'''The interpolation method ("int_method") needs to specify
+        1D or 2D and linear or cubic. The input was {int_method}''')
+
+
+def _read_only(arr):
+    '''Return `arr` as a read-only float array.'''
+    arr = np.array(arr, dtype=float)
+    arr.flags.writeable = False
+    return arr
+
+
+class Interpolator2D:
+    '''
+    Interpolator for many settlement fields sharing the same known points.
+
+    The Delaunay triangulation of the known (X, Y)-points is built once when
+    the object is created. The nodes to interpolate to are located in the
+    triangulation once by `set_nodes`, after which any number of settlement
+    fields (Z-values) can be evaluated in a single batched operation.
+
+    Parameters
+    ----------
+    x_known : list/numpy array
+        x-coordinate in points with known settlements
+    y_known : list/numpy array
+        y-coordinate in points with known settlements
+    method : str, optional
+        Method for interpolation, defaults to 'cubic'. Other valid arguments
+        are 'linear', 'nearest', 'idw' or 'rbf'. The methods 'cubic',
+        'linear' and 'nearest' give the same results as the corresponding
+        methods of `scipy.interpolate.griddata`. 'idw' is inverse distance
+        weighting of the `neighbors` nearest known points and 'rbf' is a
+        thin plate spline through the `neighbors` nearest known points of
+        each node (`scipy.interpolate.RBFInterpolator`).
+    neighbors : int, optional
+        Number of nearest known points used by the 'idw' and 'rbf' methods.
+        Defaults to 16.
+    power : float, optional
+        Power of the inverse distance for the 'idw' method. Defaults to 2.
+    max_distance : float, optional
+        The 'idw' and 'rbf' methods also extrapolate outside the convex hull
+        of the known points, where the other methods return NaN. Nodes
+        further than `max_distance` from the nearest known point are set to
+        NaN. Defaults to `None`, i.e. no limit.
+    dtype : numpy dtype, optional
+        Data type of the stored node coordinates, the interpolation weights
+        and the interpolated settlements, e.g. float32 to halve their
+        memory. Defaults to float64.
+
+    Notes
+    -----
+    The triangulation and k-d tree are built from the known coordinates as
+    given, so the results match `griddata` also where the triangulation of
+    a regular grid of known points is ambiguous. With a `dtype` of less
+    than double precision, the node coordinates are stored relative to the
+    centre of the known points, which keeps float32 coordinates accurate to
+    about 0.1 mm at chainages of many kilometres. The nodes are located and
+    evaluated in blocks of `_block_size` nodes, converted back to double
+    precision coordinates, so the temporary float64 arrays of SciPy do not
+    grow with the number of nodes.
+
+    For linear interpolation the barycentric weights of each node are stored
+    as a sparse matrix, so evaluating a stack of settlement fields is a
+    single sparse matrix product. For cubic interpolation the Clough-Tocher
+    interpolant is set up on the stored triangulation with all settlement
+    fields as columns, i.e. the triangulation is reused and the nodes are
+    located once per batch of settlement fields.
+
+    The 'idw' and 'rbf' methods are meant for dense fields of known points,
+    e.g. exported from a geotechnical model. They only use a k-d tree built
+    once over the known points, so the cost per node grows with log(n) of
+    the number of known points instead of a global triangulation. Like for
+    linear interpolation, the inverse distance weights are stored as a
+    sparse matrix.
+    '''
+
+    def __init__(self, x_known, y_known, method='cubic', neighbors=16,
+                 power=2, max_distance=None, dtype=np.float64):
+        # Check validity of interpolation method input
+        if method not in ['cubic', 'linear', 'nearest', 'idw', 'rbf']:
+            raise ValueError(f'''Interpolation method must be either "cubic",
+     "linear", "nearest", "idw" or "rbf", not {method}.''')
+
+        self.method = method
+        self.power = power
+        self.max_distance = max_distance
+        self.dtype = np.dtype(dtype)
+
+        # x-y coordinates of points with known displacements, and the
+        # origin of the stored node coordinates
+        self.points = _local_coordinates((0.0, 0.0), float, x_known, y_known)
+        self.origin = _storage_origin(self.dtype, x_known, y_known)
+        self.neighbors = min(neighbors, len(self.points))
+
+        from scipy.spatial import Delaunay, cKDTree
+
+        if method in ['nearest', 'idw', 'rbf']:
+            # Neighbour lookups only need a spatial index
+            self.tree = cKDTree(self.points)
+        else:
+            # Triangulate the known points once for all settlement fields
+            self.tri = Delaunay(self.points)
+
+        # Data for locating the nodes, set by `set_nodes`
+        self.xi = None
+        self._nodes_key = None
+        self._weights = None
+        self._inside = None
+        self._nearest = None
+
+        # Last cubic or rbf interpolant as (hash of settlement fields,
+        # interpolant), reused when the same fields are evaluated for new nodes
+        self._interpolant = (None, None)
+
+    def set_nodes(self, x, y):
+        '''
+        Locate the nodes where interpolation is desired.
+
+        Parameters
+        ----------
+        x : list/numpy array
+            x-coordinate at points where interpolation is desired
+        y : list/numpy array
+            y-coordinate at points where interpolation is desired
+        '''
+        # Nothing to do if the nodes are the same as last time
+        nodes_key = geometry_key(x, y)
+        if nodes_key == self._nodes_key:
+            return
+        self._nodes_key = nodes_key
+
+        self.xi = _local_coordinates(self.origin, self.dtype, x, y)
+        n_nodes = len(self.xi)
+
+        if self.method == 'nearest':
+            # Index of the nearest known point for each node
+            self._nearest = np.concatenate(
+                [self.tree.query(self._nodes(block))[1]
+                 for block in _blocks(n_nodes)]).astype(np.intp)
+
+        elif self.method == 'idw':
+            # Sparse (n_nodes, n_known) weights with k entries per node
+            k = self.neighbors
+            weights, indices = _csr_arrays(n_nodes, k, self.dtype)
+            self._inside = np.empty(n_nodes, dtype=bool)
+            for block in _blocks(n_nodes):
+                # Distances to the nearest known points, shape (n_block, k)
+                dist, idx = self.tree.query(self._nodes(block),
+                                            k=list(range(1, k + 1)))
+
+                # Nodes coinciding with a known point take its value exactly
+                with np.errstate(divide='ignore'):
+                    w = 1 / dist**self.power
+                exact = dist[:, 0] == 0
+                w[exact] = 0
+                w[exact, 0] = 1
+                w /= w.sum(axis=1, keepdims=True)
+
+                weights[block] = w
+                indices[block] = idx
+                self._inside[block] = self._within_max_distance(dist[:, 0])
+
+            self._weights = _csr_weights(weights, indices, len(self.points))
+
+        elif self.method == 'rbf':
+            # Only the distance limit is needed here, the local systems are
+            # solved when the settlement fields are known
+            self._inside = np.concatenate(
+                [self._within_max_distance(
+                    self.tree.query(self._nodes(block))[0])
+                 for block in _blocks(n_nodes)])
+
+        elif self.method == 'linear':
+            # Sparse (n_nodes, n_known) weights with three entries per
+            # node, left at zero for nodes outside the hull
+            bary, vertices = _csr_arrays(n_nodes, 3, self.dtype)
+            self._inside = np.empty(n_nodes, dtype=bool)
+            for block in _blocks(n_nodes):
+                # Find the simplex containing each node (-1 if outside the
+                # hull)
+                xi = self._nodes(block)
+                simplex = self.tri.find_simplex(xi)
+                inside = simplex >= 0
+                self._inside[block] = inside
+
+                # Barycentric coordinates of the nodes inside the hull
+                transform = self.tri.transform[simplex[inside]]
+                b = np.einsum('ijk,ik->ij', transform[:, :2],
+                              xi[inside] - transform[:, 2])
+                rows = np.flatnonzero(inside) + block.start
+                bary[rows, :2] = b
+                bary[rows, 2] = 1 - b.sum(axis=1)
+                vertices[rows] = self.tri.simplices[simplex[inside]]
+
+            self._weights = _csr_weights(bary, vertices, len(self.points))
+
+    def __call__(self, settlements_known, out=None):
+        '''
+        Return interpolated settlements in the nodes given to `set_nodes`.
+
+        Parameters
+        ----------
+        settlements_known : list/numpy array
+            Settlement values in the known points, either as a single field
+            of shape (n_known,) or as stacked fields of shape
+            (n_fields, n_known).
+        out : numpy array, optional
+            Array of shape (n_nodes,) or (n_fields, n_nodes) to write the
+            interpolated settlements to, e.g. a row block of a preallocated
+            result matrix. Defaults to `None`, which returns a new array
+            of the interpolator's `dtype`.
+
+        Returns
+        -------
+        numpy array
+            Interpolated settlements of shape (n_nodes,) for a single field
+            or (n_fields, n_nodes) for stacked fields.
+        '''
+        if self.xi is None:
+            raise ValueError('Nodes must be set by set_nodes before calling.')
+
+        z, out, result = _prepare_output(settlements_known, len(self.xi),
+                                         self.dtype, out)
+
+        if self.method == 'nearest':
+            for block in _blocks(len(self.xi)):
+                result[:, block] = z[:, self._nearest[block]]
+
+        elif self.method in ['linear', 'idw']:
+            # Batched evaluation as sparse matrix products over blocks of
+            # nodes
+            zt = z.T.astype(self._weights.dtype)
+            for block in _blocks(len(self.xi)):
+                result[:, block] = (self._weights[block] @ zt).T
+            result[:, ~self._inside] = np.nan
+
+        elif self.method == 'rbf':
+            from scipy.interpolate import RBFInterpolator
+
+            # Local thin plate splines with all settlement fields as columns,
+            # only set up again if the settlement fields changed
+            z_key = geometry_key(z)
+            if self._interpolant[0] != z_key:
+                self._interpolant = (z_key, RBFInterpolator(
+                    self.points, z.T, neighbors=self.neighbors))
+            result[:] = np.nan
+            inside = np.flatnonzero(self._inside)
+            for block in _blocks(len(inside)):
+                idx = inside[block]
+                result[:, idx] = self._interpolant[1](self._nodes(idx)).T
+
+        else:
+            from scipy.interpolate import CloughTocher2DInterpolator
+
+            # Clough-Tocher interpolant on the stored triangulation with all
+            # settlement fields as columns. The gradient estimation is only
+            # redone if the settlement fields changed since the last call.
+            z_key = geometry_key(z)
+            if self._interpolant[0] != z_key:
+                self._interpolant = (z_key, CloughTocher2DInterpolator(
+                    self.tri, z.T))
+            for block in _blocks(len(self.xi)):
+                result[:, block] = self._interpolant[1](
+                    self._nodes(block)).T
+
+        return out
+
+    def clear_nodes(self):
+        '''Drop the located nodes, keeping the set-up for the known points.'''
+        self.xi = None
+        self._nodes_key = None
+        self._weights = None
+        self._inside = None
+        self._nearest = None
+
+    def _nodes(self, index):
+        '''Return the double precision coordinates of the indexed nodes.'''
+        return self.xi[index].astype(float) + self.origin
+
+    def _within_max_distance(self, dist):
+        '''Return mask of nodes within `max_distance` of a known point.'''
+        if self.max_distance is None:
+            return np.ones(len(dist), dtype=bool)
+        return dist <= self.max_distance
 
 
 def interpolate_settlements2D(x_known, y_known, settlement_known, x, y,
-                              method='cubic'):
+                              method='cubic', dtype=np.float64, out=None,
+                              **kwargs):
     '''
     Return the interpolated settlement field based on known settlements in
     given points.
@@ -145,30 +920,568 @@ def interpolate_settlements2D(x_known, y_known, settlement_known, x, y,
     method : str, optional
         Method for interpolation, defaults to 'cubic' as that
         normally represents structural displacements better.
-        Other valid arguments are 'linear' or 'nearest'.
+        Other valid arguments are 'linear', 'nearest', 'idw' or 'rbf', see
+        `Interpolator2D`.
+    dtype : numpy dtype, optional
+        Data type of the node coordinates and interpolated settlements, see
+        `Interpolator2D`. Defaults to float64.
+    out : numpy array, optional
+        Array to write the interpolated settlements to. Defaults to `None`,
+        which returns a new array.
+    **kwargs
+        Further arguments for `Interpolator2D`, e.g. `max_distance`.
 
     Returns
     -------
     settlement_interpolated : np array
         Interpolated settlement values in all points (x, y).
     '''
-    # Check validity of interpolation method input
-    if method not in ['cubic', 'linear', 'nearest']:
-        raise Exception('''Interpolation method must be either "cubic",
-     "linear" or "nearest", not {method}.''')
-
-    # x-y coordinates of points with known displacements
-    xy_known = np.array(list(zip(x_known, y_known)))
+    # Get interpolator for the known points and locate the nodes
+    interpolator = get_interpolator(x_known, y_known, method=method,
+                                    dtype=dtype, **kwargs)
+    interpolator.set_nodes(x, y)
 
     # Calculate the interpolated z-values
-    settlement_interpolated = griddata(xy_known, settlement_known, (x, y),
-                                       method='cubic')
+    settlement_interpolated = interpolator(settlement_known, out=out)
 
     return settlement_interpolated
 
 
+class Interpolator1D:
+    '''
+    Interpolator for many 1D settlement fields sharing the same known X-values.
+
+    The known X-values (chainages of the sections) are sorted once when the
+    object is created. `set_nodes` locates the nodes among the known
+    X-values once with `numpy.searchsorted` and stores the interpolation
+    weights, after which any number of settlement fields can be evaluated
+    in a single batched operation.
+
+    Parameters
+    ----------
+    x_known : list/numpy array
+        x-coordinate in points with known settlements
+    method : str, optional
+        Method for interpolation, defaults to 'cubic'. Other valid arguments
+        are 'linear' or 'nearest'. The methods give the same results as
+        `scipy.interpolate.interp1d` with `bounds_error=False`, i.e. nan
+        outside the range of the known X-values.
+    dtype : numpy dtype, optional
+        Data type of the stored node coordinates and the interpolated
+        settlements, see `Interpolator2D`. Defaults to float64.
+
+    Notes
+    -----
+    Linear interpolation weights are stored as a sparse matrix with two
+    entries per node. Cubic interpolation uses the not-a-knot cubic spline
+    of `interp1d`: the B-spline basis of the nodes is stored as a sparse
+    matrix, and a call computes the spline coefficients of all settlement
+    fields at once and multiplies them with the basis.
+    '''
+
+    def __init__(self, x_known, method='cubic', dtype=np.float64):
+        # Check validity of interpolation method input
+        if method not in ['cubic', 'linear', 'nearest']:
+            raise ValueError(f'''Interpolation method must be either "cubic",
+     "linear" or "nearest", not {method}.''')
+
+        self.method = method
+        self.dtype = np.dtype(dtype)
+
+        # Sort known x-coordinates once, relative to the origin of the
+        # stored node coordinates
+        self.origin = _storage_origin(self.dtype, x_known)
+        x_known = _local_coordinates(self.origin, float, x_known)[:, 0]
+        self._order = np.argsort(x_known, kind='stable')
+        self.x_known = x_known[self._order]
+
+        # Data for locating the nodes, set by `set_nodes`
+        self.x = None
+        self._nodes_key = None
+        self._weights = None
+        self._inside = None
+
+    def set_nodes(self, x, y=None):
+        '''
+        Locate the nodes where interpolation is desired.
+
+        Parameters
+        ----------
+        x : list/numpy array
+            x-coordinate at points where interpolation is desired
+        y : list/numpy array, optional
+            Not used. Accepted so that 1D and 2D interpolators can be used
+            interchangeably.
+        '''
+        from scipy.sparse import csr_matrix
+
+        # Nothing to do if the nodes are the same as last time
+        nodes_key = geometry_key(x)
+        if nodes_key == self._nodes_key:
+            return
+        self._nodes_key = nodes_key
+
+        self.x = _local_coordinates(self.origin, self.dtype, x)[:, 0]
+        x_known = self.x_known
+        n_known = len(x_known)
+
+        # Nodes within the range of the known points
+        self._inside = (self.x >= x_known[0]) & (self.x <= x_known[-1])
+        x_in = self.x[self._inside].astype(float)
+
+        if not len(x_in):
+            # All nodes are outside, so all of them get nan
+            basis = csr_matrix((0, n_known))
+
+        elif self.method == 'cubic':
+            from scipy.interpolate import BSpline, make_interp_spline
+
+            # B-spline basis of the nodes for the knots of the not-a-knot
+            # spline through the known points
+            knots = make_interp_spline(x_known, np.zeros(n_known), k=3).t
+            basis = BSpline.design_matrix(x_in, knots, 3)
+
+        else:
+            if self.method == 'linear':
+                # Interval of each node among the known x-coordinates
+                idx = np.clip(np.searchsorted(x_known, x_in, side='right') - 1,
+                              0, n_known - 2)
+                t = (x_in - x_known[idx]) / (x_known[idx+1] - x_known[idx])
+                cols = np.column_stack((idx, idx + 1))
+                vals = np.column_stack((1 - t, t))
+            else:
+                # Nearest known point, rounding down halfway like interp1d
+                midpoints = (x_known[1:] + x_known[:-1]) / 2
+                cols = np.searchsorted(midpoints, x_in, side='left')[:, None]
+                vals = np.ones_like(cols, dtype=self.dtype)
+
+            basis = csr_matrix(
+                (vals.ravel(), cols.ravel(),
+                 np.arange(0, cols.size + 1, cols.shape[1])),
+                shape=(len(x_in), n_known))
+
+        self._weights = csr_matrix(basis, dtype=self.dtype)
+
+    def __call__(self, settlements_known, out=None):
+        '''
+        Return interpolated settlements in the nodes given to `set_nodes`.
+
+        Parameters
+        ----------
+        settlements_known : list/numpy array
+            Settlement values in the known points, either as a single field
+            of shape (n_known,) or as stacked fields of shape
+            (n_fields, n_known).
+        out : numpy array, optional
+            Array of shape (n_nodes,) or (n_fields, n_nodes) to write the
+            interpolated settlements to. Defaults to `None`, which returns
+            a new array of the interpolator's `dtype`.
+
+        Returns
+        -------
+        numpy array
+            Interpolated settlements of shape (n_nodes,) for a single field
+            or (n_fields, n_nodes) for stacked fields.
+        '''
+        if self.x is None:
+            raise ValueError('Nodes must be set by set_nodes before calling.')
+
+        z, out, result = _prepare_output(settlements_known, len(self.x),
+                                         self.dtype, out)
+        z = z[:, self._order]
+
+        if self.method == 'cubic':
+            from scipy.interpolate import make_interp_spline
+
+            # Spline coefficients of all settlement fields in one setup
+            z = make_interp_spline(self.x_known, z.T, k=3,
+                                   check_finite=False).c.T
+
+        # Evaluate the nodes inside the known range in blocks
+        result[:] = np.nan
+        zt = z.T.astype(self._weights.dtype)
+        inside = np.flatnonzero(self._inside)
+        for block in _blocks(len(inside)):
+            result[:, inside[block]] = (self._weights[block] @ zt).T
+
+        return out
+
+    def clear_nodes(self):
+        '''Drop the located nodes, keeping the sorted known points.'''
+        self.x = None
+        self._nodes_key = None
+        self._weights = None
+        self._inside = None
+
+
+# Number of nodes located or evaluated at once by the interpolators
+_block_size = 2**16
+
+
+def _blocks(n):
+    '''Return slices splitting `range(n)` into blocks of `_block_size`.'''
+    return [slice(start, min(start + _block_size, n))
+            for start in range(0, n, _block_size)]
+
+
+def _csr_arrays(n_rows, k, dtype):
+    '''Return zeroed weight and column arrays for `k` entries per row.'''
+    return np.zeros((n_rows, k), dtype=dtype), \
+        np.zeros((n_rows, k), dtype=np.int32)
+
+
+def _csr_weights(weights, columns, n_cols):
+    '''Return a sparse matrix from the arrays of `_csr_arrays`.'''
+    from scipy.sparse import csr_matrix
+
+    n_rows, k = weights.shape
+    indptr = np.arange(0, n_rows*k + 1, k,
+                       dtype=np.int32 if n_rows*k < 2**31 else np.int64)
+    return csr_matrix((weights.ravel(), columns.ravel(), indptr),
+                      shape=(n_rows, n_cols))
+
+
+def _centre(*coords):
+    '''Return the centre of the bounding box of the coordinates.'''
+    return tuple((np.min(c) + np.max(c)) / 2 if len(c) else 0.0
+                 for c in map(np.asarray, coords))
+
+
+def _storage_origin(dtype, *coords):
+    '''
+    Return the origin of node coordinates stored with `dtype`.
+
+    Coordinates of less than double precision are stored relative to the
+    centre of `coords`, double precision ones as given.
+    '''
+    if np.dtype(dtype).itemsize < 8:
+        return _centre(*coords)
+    return (0.0,) * len(coords)
+
+
+def _local_coordinates(origin, dtype, *coords):
+    '''
+    Return coordinates relative to `origin` as the columns of one array.
+
+    Each column is computed in double precision and written directly into
+    the result of the requested `dtype`, without further copies.
+    '''
+    result = np.empty((len(coords[0]), len(coords)), dtype=dtype)
+    for i, (c, o) in enumerate(zip(coords, origin)):
+        np.subtract(np.asarray(c, dtype=float), o, out=result[:, i])
+    return result
+
+
+def _prepare_output(settlements_known, n_nodes, dtype, out):
+    '''
+    Return stacked known settlements, the output array and a 2D view of it.
+
+    A new output array of `dtype` is created if `out` is `None`.
+    '''
+    z = np.asarray(settlements_known, dtype=float)
+    single_field = z.ndim == 1
+    z = np.atleast_2d(z)
+
+    shape = (n_nodes,) if single_field else (len(z), n_nodes)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f'out has shape {out.shape}, expected {shape}.')
+
+    return z, out, out[np.newaxis] if single_field else out
+
+
+class InterpolatorCache:
+    '''
+    Least recently used cache of prepared interpolators.
+
+    Interpolators are keyed by a hash of the known coordinates, the
+    dimension, the method and any further arguments, so e.g. parametric
+    studies evaluating many settlement fields on the same known points only
+    triangulate the known points once. The cached interpolators also keep
+    the located nodes from their last `set_nodes` call, which is skipped if
+    called again with the same nodes.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of interpolators to keep. The least recently used
+        interpolator is dropped when the cache is full. Defaults to 16.
+
+    Notes
+    -----
+    An interpolator returned from the cache is shared with all other users
+    of the same known points, so `set_nodes` followed by a call should not
+    be interleaved with other uses of it, e.g. from several threads.
+
+    The located nodes take memory in proportion to the number of nodes.
+    `run_analysis`, `run_load_cases_streaming` and `run_sweep` therefore
+    drop them with `clear_nodes` when they finish, and only the set-up for
+    the known points stays cached between runs.
+    '''
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._interpolators = OrderedDict()
+
+    def get(self, x_known, y_known=None, method='cubic', dtype=np.float64,
+            **kwargs):
+        '''
+        Return a prepared interpolator for the known points.
+
+        Parameters
+        ----------
+        x_known : list/numpy array
+            x-coordinate in points with known settlements
+        y_known : list/numpy array, optional
+            y-coordinate in points with known settlements. If `None`, an
+            `Interpolator1D` is returned, otherwise an `Interpolator2D`.
+        method : str, optional
+            Method for interpolation, defaults to 'cubic'.
+        dtype : numpy dtype, optional
+            Data type of the node coordinates and interpolated settlements.
+            Defaults to float64.
+        **kwargs
+            Further arguments for `Interpolator2D`, e.g. `neighbors`.
+        '''
+        dtype = np.dtype(dtype)
+        if y_known is None:
+            key = ('1d', geometry_key(x_known), method, dtype.str)
+        else:
+            key = ('2d', geometry_key(x_known, y_known), method, dtype.str)
+        key += tuple(sorted(kwargs.items()))
+
+        interpolator = self._interpolators.get(key)
+        if interpolator is not None:
+            self.hits += 1
+            self._interpolators.move_to_end(key)
+            return interpolator
+
+        self.misses += 1
+        if y_known is None:
+            interpolator = Interpolator1D(x_known, method=method, dtype=dtype,
+                                          **kwargs)
+        else:
+            interpolator = Interpolator2D(x_known, y_known, method=method,
+                                          dtype=dtype, **kwargs)
+
+        self._interpolators[key] = interpolator
+        self.resize(self.maxsize)
+        return interpolator
+
+    def resize(self, maxsize):
+        '''Set the maximum size, dropping the least recently used.'''
+        self.maxsize = maxsize
+        while len(self._interpolators) > max(maxsize, 0):
+            self._interpolators.popitem(last=False)
+
+    def clear_nodes(self):
+        '''Drop the located nodes of all cached interpolators.'''
+        for interpolator in self._interpolators.values():
+            interpolator.clear_nodes()
+
+    def clear(self):
+        '''Remove all interpolators and reset the statistics.'''
+        self._interpolators.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        '''Return the cache statistics like `functools.lru_cache`.'''
+        return dict(hits=self.hits, misses=self.misses, maxsize=self.maxsize,
+                    currsize=len(self._interpolators))
+
+    def __len__(self):
+        return len(self._interpolators)
+
+
+# Interpolators shared by `get_interpolator` and the analysis functions
+interpolator_cache = InterpolatorCache()
+
+
+def get_interpolator(x_known, y_known=None, method='cubic', **kwargs):
+    '''
+    Return a prepared interpolator from the module interpolator cache.
+
+    See `InterpolatorCache.get` for the parameters. Use
+    `interpolator_cache.info()` for the cache statistics and
+    `interpolator_cache.clear()` or `interpolator_cache.resize()` to free
+    memory.
+    '''
+    return interpolator_cache.get(x_known, y_known, method=method, **kwargs)
+
+
+def interpolate_load_cases(master_dict, x_nodes, y_nodes, dtype=np.float64,
+                           max_distance=None, neighbors=None):
+    '''
+    Return interpolated settlements for all load cases in `master_dict`.
+
+    Load cases that share the same known points, dimension and interpolation
+    method are interpolated together by one `Interpolator1D` or
+    `Interpolator2D`, so e.g. the triangulation is only built once for each
+    set of known points.
+
+    Parameters
+    ----------
+    master_dict : dict
+        Dictionary storing all information about the load cases.
+    x_nodes : numpy array
+        x-coordinate at points where interpolation is desired
+    y_nodes : numpy array
+        y-coordinate at points where interpolation is desired
+    dtype : numpy dtype, optional
+        Data type of the interpolated settlements, see `Interpolator2D`.
+        Defaults to float64.
+    max_distance, neighbors : optional
+        Defaults for the 'idw' and 'rbf' methods of load cases that do not
+        set them in their `int_method`, see `interpolation_options`.
+
+    Returns
+    -------
+    dict
+        Interpolated settlements for each load case, keyed by load case
+        number in the order of `master_dict`.
+    '''
+    return dict(iter_load_cases(master_dict, x_nodes, y_nodes, dtype=dtype,
+                                max_distance=max_distance,
+                                neighbors=neighbors))
+
+
+def iter_load_cases(master_dict, x_nodes, y_nodes, dtype=np.float64,
+                    max_distance=None, neighbors=None):
+    '''
+    Yield `(lc, settlements)` for all load cases in `master_dict` in order.
+
+    Like `interpolate_load_cases`, but each group of load cases is only
+    interpolated when its first load case is reached, and the results are
+    not kept after they are yielded. The output of earlier load cases can
+    thus be written while later ones are interpolated.
+
+    See `interpolate_load_cases` for the parameters.
+    '''
+    groups = {}
+    for group in group_load_cases(master_dict, dtype=dtype,
+                                  max_distance=max_distance,
+                                  neighbors=neighbors):
+        groups.update(dict.fromkeys(group[1], group))
+
+    # Interpolated settlements of load cases not yielded yet
+    pending = {}
+    for lc in master_dict:
+        if lc not in pending:
+            interpolator, lcs, z_stacked = groups[lc]
+            with stage('interpolation', load_cases=list(lcs),
+                       n_load_cases=len(lcs), n_nodes=len(x_nodes),
+                       interpolator=type(interpolator).__name__,
+                       method=interpolator.method):
+                interpolator.set_nodes(x_nodes, y_nodes)
+
+                # Interpolate all settlement fields of the group in one pass
+                pending.update(zip(lcs, interpolator(z_stacked)))
+
+        yield lc, pending.pop(lc)
+
+
+def group_load_cases(master_dict, dtype=np.float64, max_distance=None,
+                     neighbors=None):
+    '''
+    Return load cases grouped by known points and interpolation method.
+
+    The interpolators are created with the given `dtype`, see
+    `Interpolator2D`, and the options of `interpolation_options`.
+
+    Returns
+    -------
+    list
+        One `(interpolator, load_cases, z_stacked)` tuple per group, where
+        `interpolator` is an `Interpolator1D` or `Interpolator2D` for the
+        shared known points, `load_cases` lists the load case numbers of the
+        group and `z_stacked` holds their known settlements row by row.
+    '''
+    # Group load cases by dimension, known points and interpolation method
+    groups = {}
+    for lc in master_dict:
+        int_method = master_dict[lc]['int_method'].lower()
+        if _dimension(int_method) == '1d':
+            key = ('1d', geometry_key(master_dict[lc]['X']))
+        else:
+            key = ('2d', geometry_key(master_dict[lc]['X'],
+                                      master_dict[lc]['Y']))
+        options = interpolation_options(int_method, max_distance=max_distance,
+                                        neighbors=neighbors)
+        groups.setdefault(key + (interpolation_method(int_method),
+                                 tuple(sorted(options.items()))),
+                          []).append(lc)
+
+    grouped = []
+    for (dim, _, method, options), lcs in groups.items():
+        # One prepared interpolator for all load cases in the group
+        x_known, y_known = master_dict[lcs[0]]['X'], master_dict[lcs[0]]['Y']
+        interpolator = get_interpolator(
+            x_known, None if dim == '1d' else y_known, method=method,
+            dtype=dtype, **dict(options))
+        z_stacked = np.vstack([master_dict[lc]['Z'] for lc in lcs])
+        grouped.append((interpolator, lcs, z_stacked))
+
+    return grouped
+
+
+def geometry_key(*arrays):
+    '''Return a hash identifying the coordinate values in `arrays`.'''
+    h = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr, dtype=float)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def interpolation_method(int_method):
+    '''
+    Return the interpolation method ('linear', 'cubic', 'nearest', 'idw' or
+    'rbf') described by the `int_method` string from the input Excel file.
+    '''
+    int_method = int_method.lower()
+    for method in ['linear', 'cubic', 'nearest', 'idw', 'rbf']:
+        if method in int_method:
+            return method
+    raise ValueError(
+        f'''The interpolation method ("int_method") needs to specify
+        linear, cubic, nearest, idw or rbf. The input was {int_method}''')
+
+
+def interpolation_options(int_method, max_distance=None, neighbors=None):
+    '''
+    Return the `Interpolator2D` options of a load case.
+
+    The 'idw' and 'rbf' methods take the number of nearest known points
+    used and the largest distance to extrapolate to, e.g. from the
+    `int_method` string '2D (X,Y)-variation - IDW neighbors=8
+    max_distance=25'. Options not given in `int_method` are taken from the
+    `max_distance` and `neighbors` arguments, and left out if these are
+    `None` too. Other methods take no options, so an empty dict is returned
+    for them.
+    '''
+    if '2d' not in int_method.lower() or \
+            interpolation_method(int_method) not in ['idw', 'rbf']:
+        return {}
+
+    options = dict(max_distance=max_distance, neighbors=neighbors)
+    for name, value in re.findall(r'(max_distance|neighbors)\s*=\s*([\d.]+)',
+                                  int_method.lower()):
+        options[name] = float(value)
+    if options['neighbors'] is not None:
+        options['neighbors'] = int(options['neighbors'])
+    return {name: value for name, value in options.items()
+            if value is not None}
+
+
 def write_datfile(load_case_number, load_case_title, node_numbers,
-                  settlements, dir_target='current'):
+                  settlements, dir_target='current', precision=None,
+                  skip_nan=False, zero_tol=None, collapse=False,
+                  compress=False):
     '''Write .dat file with Teddy input code to apply load cases.
 
     The load cases represent a settlement field with the load type 'SL', which
@@ -186,75 +1499,645 @@ def write_datfile(load_case_number, load_case_title, node_numbers,
         Settlement values to be paired with `node_numbers` in the given load case.
     dir_target : str
         Path to directory to dump the output .dat file.
+    precision : int, optional
+        Number of decimals to write for the settlement values. Defaults to
+        `None`, which writes the shortest representation that round-trips
+        the full float value.
+    skip_nan : bool, optional
+        Whether to leave out nodes where the settlement is nan. Defaults to
+        `False`, which writes them as 'nan'.
+    zero_tol : float, optional
+        Leave out nodes where the absolute settlement is at most `zero_tol`,
+        see `format_poin_lines`. Defaults to `None`, which writes all nodes.
+    collapse : bool, optional
+        Whether to write runs of consecutive nodes with the same settlement
+        as one `POIN` line, see `format_poin_lines`. Defaults to `False`.
+    compress : bool, optional
+        Whether to write the file gzip-compressed with the extension
+        '.dat.gz'. It has to be decompressed before it is applied in Teddy.
+        Defaults to `False`.
+
+    Returns
+    -------
+    str
+        Path of the written .dat file.
     '''
     if dir_target == 'current':
         # Set target directory for the saved file to current working directory
         dir_target = os.getcwd()
 
-    # --- WRITE INTERPOLATED FIELD TO .DAT FILE AS TEDDY CODE ---
-    # Write Teddy code for applying interpolated settlements to file
-    file_name = f'{dir_target}\\settlement_LC{load_case_number}.dat'
-    with open(file_name, 'w') as file:
-        file.write(f'''+PROG SOFILOAD  $ Plaxis settlement LC{load_case_number}
-HEAD Settlement interpolation for LC{load_case_number} - {load_case_title}
-UNIT TYPE 5
+    # --- WRITE INTERPOLATED FIELD TO .DAT FILE AS TEDDY CODE ---
+    # Write Teddy code for applying interpolated settlements to file in one
+    # buffered write
+    file_name = os.path.join(dir_target,
+                             datfile_name(load_case_number, compress))
+    with open_datfile(file_name) as file:
+        file.write(datfile_header(load_case_number, load_case_title)
+                   + format_poin_lines(node_numbers, settlements,
+                                       precision=precision, skip_nan=skip_nan,
+                                       zero_tol=zero_tol, collapse=collapse)
+                   + 'END')
+
+    return file_name
+
+
+def datfile_name(load_case_number, compress=False):
+    '''Return the name of the .dat file of a load case.'''
+    return f'settlement_LC{load_case_number}.dat' + ('.gz' if compress else '')
+
+
+def open_datfile(file_name):
+    '''Open a .dat file for writing, gzip-compressed if it ends in '.gz'.'''
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'wt', compresslevel=6)
+    return open(file_name, 'w')
+
+
+def datfile_header(load_case_number, load_case_title):
+    '''Return the Teddy code preceding the `POIN` lines of a .dat file.'''
+    return f'''+PROG SOFILOAD  $ Plaxis settlement LC{load_case_number}
+HEAD Settlement interpolation for LC{load_case_number} - {load_case_title}
+UNIT TYPE 5
+
+{load_case_line(load_case_number, load_case_title)}'''
+
+
+def load_case_line(load_case_number, load_case_title):
+    '''Return the Teddy `LC` record defining a settlement load case.'''
+    return (f"LC {load_case_number} type 'SL' fact 1.0 facd 0.0 "
+            f"titl '{load_case_title}'  \n\n")
+
+
+class CombinedDatfile:
+    '''
+    Single .dat file applying all load cases in one SOFILOAD block.
+
+    Instead of one file per load case, each with its own `+PROG SOFILOAD`
+    header, the load cases are appended to one file as `LC` records followed
+    by their `POIN` lines, so SOFiSTiK only starts SOFILOAD once. Combined
+    with `zero_tol` and `collapse` this also keeps the file small.
+
+    Parameters
+    ----------
+    file_name : str
+        Path of the file to write. With `compress`, '.gz' is appended.
+    compress : bool, optional
+        Whether to write the file gzip-compressed. It has to be decompressed
+        before it is applied in Teddy. Defaults to `False`.
+    precision, skip_nan, zero_tol, collapse : optional
+        Formatting of the `POIN` lines, see `format_poin_lines`.
+
+    Notes
+    -----
+    `add` may be called from several threads. Each load case is written as
+    a whole, in the order the calls are made.
+    '''
+
+    def __init__(self, file_name, compress=False, precision=None,
+                 skip_nan=False, zero_tol=None, collapse=False):
+        self.file_name = file_name + ('.gz' if compress else '')
+        self.load_cases = []
+        self._format = dict(precision=precision, skip_nan=skip_nan,
+                            zero_tol=zero_tol, collapse=collapse)
+        self._lock = threading.Lock()
+        self._file = open_datfile(self.file_name)
+        self._file.write('''+PROG SOFILOAD  $ Plaxis settlements
+HEAD Settlement interpolation
+UNIT TYPE 5
+
+''')
+
+    def add(self, load_case_number, load_case_title, node_numbers,
+            settlements):
+        '''Append a load case with its `POIN` lines to the file.'''
+        text = (load_case_line(load_case_number, load_case_title)
+                + format_poin_lines(node_numbers, settlements, **self._format)
+                + '\n')
+        with self._lock:
+            self._file.write(text)
+            self.load_cases.append(load_case_number)
+
+    def close(self):
+        '''End the SOFILOAD block and close the file.'''
+        if not self._file.closed:
+            self._file.write('END')
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def format_poin_lines(node_numbers, settlements, precision=None,
+                      skip_nan=False, zero_tol=None, collapse=False):
+    '''
+    Return Teddy `POIN` lines applying `settlements` to `node_numbers`.
+
+    All lines are formatted in a single string formatting operation over the
+    whole block, instead of one call per node.
+
+    Parameters
+    ----------
+    node_numbers : list or list-like
+        Node numbers that should receive a settlement.
+    settlements : list or list-like
+        Settlement values to be paired with `node_numbers`.
+    precision : int, optional
+        Number of decimals to write for the settlement values. Defaults to
+        `None`, which writes the shortest representation that round-trips
+        the full float value.
+    skip_nan : bool, optional
+        Whether to leave out nodes where the settlement is nan. Defaults to
+        `False`.
+    zero_tol : float, optional
+        Leave out nodes where the absolute settlement is at most `zero_tol`,
+        as a zero settlement does not load the node. Use 0 to only leave out
+        exact zeros. Nan values are not affected. Defaults to `None`, which
+        keeps all nodes.
+    collapse : bool, optional
+        Whether to write runs of consecutively numbered nodes with the same
+        written settlement as one line, using the CADINP list generation
+        `NODE (first last 1)`. Defaults to `False`.
+
+    Returns
+    -------
+    str
+        One line per node (or run of nodes), each terminated by a newline.
+    '''
+    node_numbers = np.asarray(node_numbers)
+    settlements = np.asarray(settlements)
+    if settlements.dtype != np.float32:
+        settlements = settlements.astype(float, copy=False)
+
+    if skip_nan:
+        # Keep only nodes with a valid settlement value
+        valid = ~np.isnan(settlements)
+        node_numbers, settlements = node_numbers[valid], settlements[valid]
+
+    if zero_tol is not None:
+        # Leave out nodes without settlement (nan compares as False)
+        loaded = ~(np.abs(settlements) <= zero_tol)
+        node_numbers, settlements = node_numbers[loaded], settlements[loaded]
+
+    value_fmt = '%r' if precision is None else f'%.{precision}f'
+    if precision is None and settlements.dtype == np.float32:
+        # Shortest representation of the float32 values, instead of all
+        # digits of their conversion to a Python float
+        values, value_fmt = settlements.astype(str).tolist(), '%s'
+    else:
+        values = settlements.tolist()
+
+    if collapse:
+        return _format_poin_runs(node_numbers, values, value_fmt)
+
+    # Interleave node numbers and settlements as the arguments of one
+    # format string repeated for every node
+    n = len(values)
+    args = np.empty(2 * n, dtype=object)
+    args[0::2] = node_numbers.tolist()
+    args[1::2] = values
+
+    line = f'  POIN NODE %d WIDE 0 TYPE WZZ {value_fmt} \n'
+
+    return (line * n) % tuple(args)
+
+
+def _format_poin_runs(node_numbers, settlements, value_fmt):
+    '''Return `POIN` lines with one line per run of equal settlements.'''
+    n = len(settlements)
+    if n == 0:
+        return ''
+
+    # Compare the values as written, so that values rounded to the same
+    # precision are collapsed as well
+    values = np.array(((value_fmt + '\n') * n
+                       % tuple(settlements)).split('\n')[:-1])
+
+    # A run ends where the node numbers are not consecutive or the written
+    # value changes
+    breaks = (np.diff(node_numbers) != 1) | (values[1:] != values[:-1])
+    starts = np.flatnonzero(np.concatenate(([True], breaks)))
+    ends = np.append(starts[1:], n) - 1
+
+    first = node_numbers[starts].tolist()
+    last = node_numbers[ends].tolist()
+    return ''.join(
+        f'  POIN NODE {a} WIDE 0 TYPE WZZ {v} \n' if a == b else
+        f'  POIN NODE ({a} {b} 1) WIDE 0 TYPE WZZ {v} \n'
+        for a, b, v in zip(first, last, values[starts].tolist()))
+
+
+def print_status_report(x_nodes, y_nodes, settlement_interpolated, load_case,
+                        n_total=None, nan_file=None, max_regions=10,
+                        n_nan=None):
+    '''
+    Print a status report summarizing the interpolation for each load case.
+
+    `n_total` is the total number of interpolated nodes, if the given
+    arrays only hold a sample of them. Defaults to the length of
+    `settlement_interpolated`. Likewise, `n_nan` is the total number of nan
+    values if the sample does not hold all of them. The regions are then
+    found from the nan values in the sample.
+
+    Nodes that failed to interpolate are summarized by their extent and the
+    `max_regions` largest regions they form, see `nan_diagnostics`, so the
+    report stays short for any number of them. `nan_file` is the file with
+    the full list of failed nodes, if written (see `write_nan_nodes`).
+
+    Returns the number of nan values.
+    '''
+    print('--------------------------------------------')
+    print('RESULTS FROM SETTLEMENT INTERPOLATION SCRIPT')
+    print('--------------------------------------------')
+
+    # Check if interpolated settlements have any nan values
+    print(f'    LC{load_case}:')
+    diagnostics = nan_diagnostics(x_nodes, y_nodes, settlement_interpolated)
+    n_sample = diagnostics['n_nan']
+    if n_nan is None:
+        n_nan = n_sample
+    if n_nan:
+        print('''
+    ### --- INFO --- ###:
+    Some interpolated settlement values are 'nan'.
+    This is probably because they fall out of the region
+    defined by known points (extrapolation not supported).
+
+    The input field must encompass all the points where
+    interpolated is desired.
+    E.g. if the desired points for a 1D interpolation are
+    X-coordinates x = (0, 100, 200), the input X-values
+    must contain a point where X < 0 and one where X > 200''')
+
+        no_all = len(settlement_interpolated) if n_total is None else n_total
+        print(
+            f'''
+    Number of nan values are {n_nan} out of {no_all} total values.''')
+
+        # Extent of the failed nodes and the largest regions they form
+        regions = diagnostics['regions']
+        rows = '\n'.join(
+            f'    {i:>6} {region["n_nodes"]:>8} ' + ' '.join(
+                f'{value:>10.1f}' for value in region['bbox'])
+            for i, region in enumerate(regions[:max_regions], start=1))
+        if len(regions) > max_regions:
+            rows += f'''
+    ... and {len(regions) - max_regions} smaller regions with \
+{sum(r['n_nodes'] for r in regions[max_regions:])} nodes'''
+        sampled = '' if n_sample == n_nan else f'''
+    (found from an evenly thinned sample of {n_sample} of them)'''
+        print(
+            f'''
+    Points that failed to interpolate form {len(regions)} region(s):{sampled}
+    Region    Nodes      X min      Y min      X max      Y max
+{rows}''')
+
+        if nan_file is not None:
+            print(f'''
+    All points that failed to interpolate are listed in
+    {os.path.basename(nan_file)} next to the dat files.''')
+
+        print(
+            '''
+    The interpolation can be visually inspected in the generated
+    PNG-file. It will reveal the locations of the nan-values.''')
+
+    else:
+        print('         All values interpolated successfully!')
+    print('-------------------------------------------')
+
+    return n_nan
+
+
+def nan_diagnostics(x_nodes, y_nodes, settlements, cluster_distance=None):
+    '''
+    Return the number and regions of nodes that failed to interpolate.
+
+    The failed nodes are binned into square cells of size
+    `cluster_distance`, and neighbouring cells with failed nodes are joined
+    into one region. Failed nodes closer than `cluster_distance` to each
+    other are therefore always in the same region.
+
+    Parameters
+    ----------
+    x_nodes, y_nodes : numpy array
+        Coordinates of the interpolated nodes.
+    settlements : numpy array
+        Interpolated settlements, nan where interpolation failed.
+    cluster_distance : float, optional
+        Size of the cells. Defaults to `None`, which uses 2 % of the larger
+        side of the bounding box of all nodes.
+
+    Returns
+    -------
+    dict
+        'n_nan' : Number of failed nodes.
+        'mask' : Boolean array, `True` for failed nodes.
+        'bbox' : `(x_min, y_min, x_max, y_max)` of the failed nodes, or
+        `None` if there are none.
+        'regions' : List of regions, largest first, each a dict with the
+        number of nodes ('n_nodes') and their 'bbox'.
+    '''
+    mask = np.isnan(settlements)
+    n_nan = int(mask.sum())
+    diagnostics = dict(n_nan=n_nan, mask=mask, bbox=None, regions=[])
+    if not n_nan:
+        return diagnostics
+
+    x_nodes = np.asarray(x_nodes, dtype=float)
+    y_nodes = np.asarray(y_nodes, dtype=float)
+    if cluster_distance is None:
+        cluster_distance = 0.02 * max(np.ptp(x_nodes), np.ptp(y_nodes))
+
+    x, y = x_nodes[mask], y_nodes[mask]
+    diagnostics['bbox'] = (x.min(), y.min(), x.max(), y.max())
+
+    # Sort the failed nodes by region and reduce each region at once
+    labels = _nan_regions(x, y, cluster_distance)
+    order = np.argsort(labels, kind='stable')
+    labels = labels[order]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    n_nodes = np.diff(np.r_[starts, len(labels)])
+    x, y = x[order], y[order]
+    bboxes = np.column_stack((np.minimum.reduceat(x, starts),
+                              np.minimum.reduceat(y, starts),
+                              np.maximum.reduceat(x, starts),
+                              np.maximum.reduceat(y, starts)))
+
+    largest = np.argsort(-n_nodes, kind='stable')
+    diagnostics['regions'] = [
+        dict(n_nodes=int(n_nodes[i]), bbox=tuple(bboxes[i].tolist()))
+        for i in largest]
+    return diagnostics
+
+
+def _nan_regions(x, y, cluster_distance):
+    '''Return region labels of failed nodes, see `nan_diagnostics`.'''
+    if len(x) < 2 or cluster_distance <= 0:
+        return np.zeros(len(x), dtype=int)
+
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    # Cell of each failed node, numbered row by row
+    ix = ((x - x.min()) // cluster_distance).astype(np.int64)
+    iy = ((y - y.min()) // cluster_distance).astype(np.int64)
+    ny = iy.max() + 1
+    cells, node_cell = np.unique(ix * ny + iy, return_inverse=True)
+    cx, cy = np.divmod(cells, ny)
+
+    # Link each occupied cell to its occupied neighbours ahead of it
+    rows, cols = [], []
+    for dx, dy in [(0, 1), (1, -1), (1, 0), (1, 1)]:
+        neighbour = (cx + dx) * ny + cy + dy
+        pos = np.minimum(np.searchsorted(cells, neighbour), len(cells) - 1)
+        found = (cells[pos] == neighbour) & (cy + dy >= 0) & (cy + dy < ny)
+        rows.append(np.flatnonzero(found))
+        cols.append(pos[found])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+
+    graph = coo_matrix((np.ones(len(rows)), (rows, cols)),
+                       shape=(len(cells), len(cells)))
+    return connected_components(graph, directed=False)[1][node_cell.ravel()]
+
+
+def write_nan_nodes(file_name, node_numbers, x_nodes, y_nodes, settlements):
+    '''
+    Write the nodes that failed to interpolate to a CSV file.
+
+    The file has the columns 'NR', 'X [m]' and 'Y [m]'. If no node failed,
+    the file is not written, and a file left from an earlier run is
+    removed.
+
+    Returns
+    -------
+    int
+        Number of nodes that failed to interpolate.
+    '''
+    mask = np.isnan(settlements)
+    n_nan = int(mask.sum())
+    if not n_nan:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        return 0
+
+    with open(file_name, 'w') as file:
+        file.write(NAN_NODES_HEADER + nan_node_rows(node_numbers, x_nodes,
+                                                    y_nodes, mask))
+
+    return n_nan
+
+
+# Header of the files with the nodes that failed to interpolate
+NAN_NODES_HEADER = 'NR,X [m],Y [m]\n'
+
+
+def nan_node_rows(node_numbers, x_nodes, y_nodes, mask):
+    '''Return the CSV rows of the nodes selected by `mask`.'''
+    n_nan = int(mask.sum())
+
+    # Format all rows in one operation, as for the POIN lines
+    args = np.empty(3 * n_nan, dtype=object)
+    args[0::3] = np.asarray(node_numbers)[mask].tolist()
+    args[1::3] = np.asarray(x_nodes, dtype=float)[mask].tolist()
+    args[2::3] = np.asarray(y_nodes, dtype=float)[mask].tolist()
+    return ('%d,%r,%r\n' * n_nan) % tuple(args)
+
+
+def report_load_case(lc, x_nodes, y_nodes, node_no, settlements,
+                     dir_target='current', n_total=None, n_nan=None):
+    '''
+    Write the failed nodes of load case `lc` and print its status report.
+
+    The failed nodes are written to 'nan_nodes_LC{lc}.csv' in `dir_target`,
+    see `write_nan_nodes`. If the arrays only hold a sample of the nodes,
+    `n_total` and `n_nan` are the total numbers of nodes and nan values, and
+    the file is expected to be written already, see `nan_nodes_name`.
+    Returns the number of nan values.
+    '''
+    if dir_target in ['current', 'current_dir']:
+        dir_target = os.getcwd()
+
+    nan_file = os.path.join(dir_target, nan_nodes_name(lc))
+    n_nodes = len(node_no) if n_total is None else n_total
+    with stage('status_report', load_case=lc, n_nodes=n_nodes) as info:
+        if n_nan is None:
+            n_nan = write_nan_nodes(nan_file, node_no, x_nodes, y_nodes,
+                                    settlements)
+        elif not n_nan and os.path.exists(nan_file):
+            # Remove the list left from an earlier run
+            os.remove(nan_file)
+        info['n_nan'] = print_status_report(
+            x_nodes, y_nodes, settlements, lc, n_total=n_total,
+            nan_file=nan_file if n_nan else None, n_nan=n_nan)
+    return info['n_nan']
+
+
+def nan_nodes_name(load_case_number):
+    '''Return the name of the file with the failed nodes of a load case.'''
+    return f'nan_nodes_LC{load_case_number}.csv'
+
+
+def read_excel_nodes(dir_lookup='current',
+                     filename='nodes_to_be_interpolated.xlsx',
+                     sheet_name='XLSX-Export'):
+    '''Return (x, y, z)-coordinates and node numbers for all nodes.
+
+    Parameters
+    ----------
+    dir_lookup : str
+        Directory where the Excel file is located.
+    filename : str
+        Filename of Excel file with extension (.xlsx or .xlsm).
+    sheet_name : str
+        Sheet name where node data is located within the Excel file
+    '''
+    if dir_lookup == 'current':
+        # Get directory where script is run from
+        dir_lookup = os.getcwd()
+
+    import pandas as pd
+
+    # Read Excel file with node numbers and their coordinates into a dataframe
+    with stage('read_excel_nodes') as info:
+        df_nodes = pd.read_excel(
+            os.path.join(dir_lookup, filename), sheet_name=sheet_name)
+        info['n_nodes'] = len(df_nodes)
+
+    return _node_columns(df_nodes)
+
+
+def _node_columns(df_nodes):
+    '''Return node coordinates and node numbers from a dataframe.'''
+    # Remove leading or trailing white space from column names
+    df_nodes.columns = df_nodes.columns.str.strip()
+
+    # Extract node coordinates and node numbers and return them
+    x_nodes, y_nodes = df_nodes['X [m]'].values, df_nodes['Y [m]'].values
+    z_nodes, node_no = df_nodes['Z [m]'].values, df_nodes['NR'].values
+
+    return x_nodes, y_nodes, z_nodes, node_no
+
+
+def read_nodes(dir_lookup='current',
+               filename='nodes_to_be_interpolated.xlsx',
+               sheet_name='XLSX-Export'):
+    '''Return (x, y, z)-coordinates and node numbers for all nodes.
+
+    The format of the file is determined from its extension:
+
+    * .xlsx/.xlsm: the SOFiSTiK Excel export, see `read_excel_nodes`.
+    * .csv/.parquet: a table with the columns 'NR', 'X [m]', 'Y [m]' and
+      'Z [m]' like the Excel export. CSV files are read with the pyarrow
+      engine of pandas if pyarrow is installed.
+    * .npy: a structured array with the fields 'NR', 'X [m]', 'Y [m]' and
+      'Z [m]', or a 2D array with these four columns in that order. The
+      file is memory-mapped.
+    * .npz: the arrays 'x', 'y', 'z' and 'node_no', e.g. the sidecar
+      written by `load_nodes`.
+
+    Parameters
+    ----------
+    dir_lookup : str
+        Directory where the file is located.
+    filename : str
+        Filename with extension.
+    sheet_name : str
+        Sheet name where node data is located, only used for Excel files.
+    '''
+    if dir_lookup == 'current':
+        # Get directory where script is run from
+        dir_lookup = os.getcwd()
+
+    fmt = file_format(filename)
+    if fmt == 'excel':
+        return read_excel_nodes(dir_lookup=dir_lookup, filename=filename,
+                                sheet_name=sheet_name)
+
+    path = os.path.join(dir_lookup, filename)
+    with stage('read_nodes', format=fmt) as info:
+        if fmt == 'csv':
+            import pandas as pd
+            nodes = _node_columns(pd.read_csv(path, **_csv_options()))
+
+        elif fmt == 'parquet':
+            import pandas as pd
+            nodes = _node_columns(pd.read_parquet(path))
+
+        elif fmt == 'npy':
+            nodes = _array_node_columns(np.load(path, mmap_mode='r'))
+
+        else:
+            with np.load(path, allow_pickle=False) as data:
+                nodes = tuple(data[key] for key in ['x', 'y', 'z', 'node_no'])
+
+        info['n_nodes'] = len(nodes[3])
+
+    return nodes
 
-LC {load_case_number} type 'SL' fact 1.0 facd 0.0 titl '{load_case_title}'  \n
-''')
-        for node, settlement in zip(node_numbers, settlements):
-            file.write(f'  POIN NODE {node} WIDE 0 TYPE WZZ {settlement} \n')
-        file.write('END')
 
+def _csv_options():
+    '''Return keyword arguments for reading node tables with pandas.'''
+    from importlib.util import find_spec
 
-def print_status_report(x_nodes, y_nodes, settlement_interpolated, load_case):
-    '''
-    Print a status report summarizing the interpolation for each load case.
-    '''
-    print('--------------------------------------------')
-    print('RESULTS FROM SETTLEMENT INTERPOLATION SCRIPT')
-    print('--------------------------------------------')
+    # The pyarrow engine reads large CSV files several times faster
+    return {'engine': 'pyarrow'} if find_spec('pyarrow') else {}
 
-    # Check if interpolated settlements have any nan values
-    print(f'    LC{load_case}:')
-    if np.isnan(settlement_interpolated).any():
-        print('''
-    ### --- INFO --- ###:
-    Some interpolated settlement values are 'nan'.
-    This is probably because they fall out of the region
-    defined by known points (extrapolation not supported).
 
-    The input field must encompass all the points where
-    interpolated is desired.
-    E.g. if the desired points for a 1D interpolation are
-    X-coordinates x = (0, 100, 200), the input X-values
-    must contain a point where X < 0 and one where X > 200''')
+def _array_node_columns(arr):
+    '''Return node coordinates and node numbers from a node array.'''
+    if arr.dtype.names is not None:
+        columns = [arr[name] for name in ['X [m]', 'Y [m]', 'Z [m]', 'NR']]
+    else:
+        columns = [arr[:, col] for col in [1, 2, 3, 0]]
+    x_nodes, y_nodes, z_nodes, node_no = columns
+    return x_nodes, y_nodes, z_nodes, np.asarray(node_no, dtype=np.int64)
 
-        nans = np.argwhere(np.isnan(settlement_interpolated))
-        no_all = len(settlement_interpolated)
-        print(
-            f'''
-    Number of nan values are {len(nans)} out of {no_all} total values.''')
 
-        # Extract X- and Y-coordinates and round to 1 digit
-        x_nans = np.round(x_nodes[nans.flatten()], 1)
-        y_nans = np.round(y_nodes[nans.flatten()], 1)
-        nan_coords = list(zip(x_nans, y_nans))
+def iter_nodes(dir_lookup='current',
+               filename='nodes_to_be_interpolated.xlsx',
+               sheet_name='XLSX-Export', chunk_size=100000):
+    '''Yield (x, y, z)-coordinates and node numbers in chunks of nodes.
 
-        print(
-            f'''
-    The interpolation can be visually inspected in the generated
-    PNG-file. It will reveal the locations of the nan-values.
-    (X, Y)-coordinates of points that failed to interpolate are:\n{nan_coords} ''')
+    Excel and CSV files are streamed, so only one chunk of nodes is held in
+    memory at a time. The other formats of `read_nodes` are read at once
+    (.npy files are memory-mapped) and yielded in chunks.
+
+    See `iter_excel_nodes` for the parameters.
+    '''
+    if dir_lookup == 'current':
+        # Get directory where script is run from
+        dir_lookup = os.getcwd()
+
+    fmt = file_format(filename)
+    if fmt == 'excel':
+        yield from iter_excel_nodes(dir_lookup=dir_lookup, filename=filename,
+                                    sheet_name=sheet_name,
+                                    chunk_size=chunk_size)
+
+    elif fmt == 'csv':
+        import pandas as pd
+        with pd.read_csv(os.path.join(dir_lookup, filename),
+                         chunksize=chunk_size) as reader:
+            for df_chunk in reader:
+                yield _node_columns(df_chunk)
 
     else:
-        print('         All values interpolated successfully!')
-    print('-------------------------------------------')
+        nodes = read_nodes(dir_lookup=dir_lookup, filename=filename)
+        for start in range(0, len(nodes[3]), chunk_size):
+            yield tuple(np.array(arr[start:start+chunk_size])
+                        for arr in nodes)
 
 
-def read_excel_nodes(dir_lookup='current',
+def iter_excel_nodes(dir_lookup='current',
                      filename='nodes_to_be_interpolated.xlsx',
-                     sheet_name='XLSX-Export'):
-    '''Return (x, y, z)-coordinates and node numbers for all nodes.
+                     sheet_name='XLSX-Export', chunk_size=100000):
+    '''Yield (x, y, z)-coordinates and node numbers in chunks of nodes.
+
+    The Excel file is streamed row by row, so only one chunk of nodes is
+    held in memory at a time.
 
     Parameters
     ----------
@@ -264,23 +2147,154 @@ def read_excel_nodes(dir_lookup='current',
         Filename of Excel file with extension (.xlsx or .xlsm).
     sheet_name : str
         Sheet name where node data is located within the Excel file
+    chunk_size : int, optional
+        Maximum number of nodes per chunk. Defaults to 100000.
+
+    Yields
+    ------
+    tuple
+        Arrays `(x_nodes, y_nodes, z_nodes, node_no)` for the next chunk.
     '''
+    import openpyxl
+
     if dir_lookup == 'current':
-        # Get directory where this module resides
+        # Get directory where script is run from
         dir_lookup = os.getcwd()
 
-    # Read Excel file with node numbers and their coordinates into a dataframe
-    df_nodes = pd.read_excel(
-        f'{dir_lookup}\\{filename}', sheet_name=sheet_name)
+    wb = openpyxl.load_workbook(os.path.join(dir_lookup, filename),
+                                read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+
+        # Find the columns from the header, ignoring surrounding white space
+        header = [str(name).strip() for name in next(rows)]
+        cols = [header.index(name) for name in ['X [m]', 'Y [m]', 'Z [m]', 'NR']]
+
+        chunk = []
+        for row in rows:
+            if row[cols[3]] is None:
+                # Skip rows without a node number (e.g. empty rows)
+                continue
+            chunk.append([row[col] for col in cols])
+            if len(chunk) == chunk_size:
+                yield _node_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield _node_chunk(chunk)
+    finally:
+        wb.close()
+
+
+def _node_chunk(rows):
+    '''Return node arrays from a list of (x, y, z, node_no) rows.'''
+    values = np.array(rows, dtype=float)
+    return (values[:, 0], values[:, 1], values[:, 2],
+            values[:, 3].astype(np.int64))
+
+
+# Node arrays already read in this session, keyed by absolute file path
+_node_cache = {}
+
+
+def load_nodes(dir_lookup='current',
+               filename='nodes_to_be_interpolated.xlsx',
+               sheet_name='XLSX-Export', sidecar=True):
+    '''Return (x, y, z)-coordinates and node numbers, reading the file once.
+
+    The parsed arrays are cached in memory for the rest of the session and
+    reused as long as the path, modification time and size of the file are
+    unchanged. Unless `sidecar` is `False`, the arrays of Excel and CSV
+    files are also stored in a binary `.npz` file next to the file, which
+    later runs reuse instead of parsing the file again if it has not
+    changed.
 
-    # Remove leading or trailing white space from column names
-    df_nodes.columns = df_nodes.columns.str.strip()
+    Parameters
+    ----------
+    dir_lookup : str
+        Directory where the file is located.
+    filename : str
+        Filename with extension, in one of the formats of `read_nodes`.
+    sheet_name : str
+        Sheet name where node data is located within the Excel file
+    sidecar : bool, optional
+        Whether to read and write the binary sidecar file. Defaults to
+        `True`.
 
-    # Extract node coordinates and node numbers and return them
-    x_nodes, y_nodes = df_nodes['X [m]'].values, df_nodes['Y [m]'].values
-    z_nodes, node_no = df_nodes['Z [m]'].values, df_nodes['NR'].values
+    Notes
+    -----
+    The returned arrays are shared between calls and are therefore
+    read-only.
+    '''
+    if dir_lookup == 'current':
+        # Get directory where script is run from
+        dir_lookup = os.getcwd()
 
-    return x_nodes, y_nodes, z_nodes, node_no
+    path = os.path.abspath(os.path.join(dir_lookup, filename))
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size, sheet_name)
+
+    # Reuse arrays from this session if the file has not changed
+    cached = _node_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    # Binary formats are read quickly enough without a sidecar
+    sidecar = sidecar and file_format(path) in ['excel', 'csv']
+
+    sidecar_path = f'{os.path.splitext(path)[0]}.nodes.npz'
+    nodes = None
+    if sidecar:
+        with stage('read_node_sidecar') as info:
+            nodes = _read_node_sidecar(sidecar_path, signature)
+            info['n_nodes'] = 0 if nodes is None else len(nodes[0])
+
+    if nodes is None:
+        # Sidecar missing or outdated, parse the file
+        nodes = read_nodes(dir_lookup=dir_lookup, filename=filename,
+                           sheet_name=sheet_name)
+        if sidecar:
+            _write_node_sidecar(sidecar_path, signature, nodes)
+
+    for arr in nodes:
+        arr.setflags(write=False)
+
+    _node_cache[path] = (signature, nodes)
+    return nodes
+
+
+def clear_node_cache():
+    '''Clear the in-memory cache of node arrays used by `load_nodes`.'''
+    _node_cache.clear()
+
+
+def _read_node_sidecar(sidecar_path, signature):
+    '''Return node arrays from sidecar file if it matches `signature`.'''
+    try:
+        with np.load(sidecar_path, allow_pickle=False) as data:
+            stored = (int(data['mtime_ns']), int(data['size']),
+                      str(data['sheet_name']))
+            if stored != signature:
+                return None
+            return tuple(data[key] for key in ['x', 'y', 'z', 'node_no'])
+    except (OSError, KeyError, ValueError):
+        # Missing or unreadable sidecar, fall back to the Excel file
+        return None
+
+
+def _write_node_sidecar(sidecar_path, signature, nodes):
+    '''Write node arrays to sidecar file, ignoring unwritable folders.'''
+    x, y, z, node_no = nodes
+    mtime_ns, size, sheet_name = signature
+    tmp_path = f'{sidecar_path}.tmp'
+    try:
+        # Write to temporary file first so an interrupted run never leaves
+        # a corrupt sidecar behind
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, x=x, y=y, z=z, node_no=node_no,
+                     mtime_ns=mtime_ns, size=size, sheet_name=sheet_name)
+        os.replace(tmp_path, sidecar_path)
+    except OSError:
+        pass
 
 
 def load_cases(file_name, sheet_name, skiprows):
@@ -289,7 +2303,9 @@ def load_cases(file_name, sheet_name, skiprows):
     Parameters
     ----------
     file_name : str
-        Name of Excel file to read, including file extention (.xlsx or .xlsm)
+        Name of Excel file to read, including file extention (.xlsx or
+        .xlsm). The sheet can also be given in one of the other formats
+        supported by `read_sheet`.
     sheet_name : str
         Name of sheet where the data for load cases is stored.
     skiprows : int
@@ -304,32 +2320,43 @@ def load_cases(file_name, sheet_name, skiprows):
     '''
 
     # Read load cases, their titles and the desired interpolation method
-    df_load_cases = pd.read_excel(file_name, sheet_name=sheet_name,
-                                  skiprows=skiprows-2, usecols=range(6, 26))
-
-    # Retain only columns starting with integers of any length
-    df_load_cases = df_load_cases.filter(regex='^\d+', axis=1).loc[:1]
-
-    # Convert df of LCs, titles and int_method to dict of dicts,
-    # one for each LC
-    #   format: { lc_number: {0: 'title_here', 1: 'method_here'} }
-    load_case_dict = df_load_cases.to_dict(orient='dict')
+    # from the three header rows above the known values
+    values = read_sheet(file_name, sheet_name)
+    lc_numbers, titles, int_methods = values[skiprows-2:skiprows+1]
 
-    # Rename keys in inner dictionaries
+    # Retain only columns whose load case number starts with an integer
     #   format: {lc_number: {title: 'title_here', 'int_method': 'method_here'}}
-    for dic in load_case_dict.values():
-        dic['title'] = dic.pop(0)
-        dic['int_method'] = dic.pop(1)
+    load_case_dict = {}
+    for col in range(6, values.shape[1]):
+        lc = lc_numbers[col]
+        if lc is None or not re.match(r'^\d+', str(lc)):
+            continue
+        if isinstance(lc, float) and lc.is_integer():
+            lc = int(lc)
+        load_case_dict[lc] = {'title': titles[col],
+                              'int_method': int_methods[col]}
 
     return load_case_dict
 
 
 def plot_interpolation(xycoords, node_no, lc, master_dict,
-                       settlements_interpolated, png_targetdir='current'):
+                       settlements_interpolated, png_targetdir='current',
+                       max_points=None):
     '''
     Plot the result of the interpolation as a 3D scatter plot showing
     the known points that the interpolation is based on in green and
     the interpolated points in blue.
+
+    The plot is rendered off-screen (Agg) on a figure that is reused for
+    every load case plotted in the process, so memory does not grow with
+    the number of load cases.
+
+    Parameters
+    ----------
+    max_points : int, optional
+        Maximum number of successfully interpolated points to plot. Nodes
+        where interpolation failed (nan) and the known points are always
+        plotted. Defaults to `None`, which plots all points.
     '''
     # Extract x- and y-coordinates
     x_nodes, y_nodes = xycoords
@@ -340,20 +2367,22 @@ def plot_interpolation(xycoords, node_no, lc, master_dict,
     settlements_known = master_dict[lc]['Z']
     int_method = master_dict[lc]['int_method'].lower()
 
-    if '2d' in int_method:
-        # Create figure object
-        fig = plt.figure()
+    if _dimension(int_method) == '2d':
+        # Reduce the interpolated points to plot
+        idx = plot_sample(settlements_interpolated, max_points)
+        x_nodes, y_nodes = x_nodes[idx], y_nodes[idx]
+        settlements_interpolated = settlements_interpolated[idx]
 
-        # Create axis object for 3D plot (Visualizing 2D interpolations)
-        ax = fig.add_subplot(111, projection='3d')
+        # Get cleared axis object for 3D plot (Visualizing 2D interpolations)
+        ax = _plot_axes(projection='3d')
 
         # Plot known settlement points
         ax.scatter(x_known, y_known, settlements_known,
-                   '-.', color='limegreen', label='Known points')
+                   color='limegreen', label='Known points')
 
         # Plot interpolated field
         ax.scatter(x_nodes, y_nodes, settlements_interpolated,
-                   '.', color='cornflowerblue', s=0.1, label='Interpolated points')
+                   color='cornflowerblue', s=0.1, label='Interpolated points')
 
         # Create separate array of nan-values, if there are any
         if np.isnan(settlements_interpolated).any():
@@ -375,33 +2404,35 @@ def plot_interpolation(xycoords, node_no, lc, master_dict,
         ax.set_xlabel('Chainage [m]')
         ax.set_ylabel('y [mm]')
         ax.set_zlabel('Settlement [mm]')
-        plt.legend(loc='center left', bbox_to_anchor=(-0.15, 0.5), fontsize='small')
-
-        # Define name for png file to save
-        png_name = f'LC{lc}_settl_interp_plot.png'
+        ax.legend(loc='center left', bbox_to_anchor=(-0.15, 0.5), fontsize='small')
 
-        if png_targetdir == 'current':
-            # Save figure
-            fig.savefig(png_name)
-        else:
-            # Save figure in the folder that was input
-            fig.savefig(f'{png_targetdir}\\{png_name}')
+        # Save figure as png file
+        _save_plot(ax, lc, png_targetdir)
 
-    elif '1d' in int_method:
+    else:
         # Create plot and save as png-figure
         plot_1d_interpolation(lc, x_known, settlements_known, x_nodes,
-                              settlements_interpolated, png_targetdir='current')
-
-    else:
-        raise Exception(
-            '''The interpolation method ("int_method") needs to specify 1D or
-             2D and linear or cubic.''')
+                              settlements_interpolated,
+                              png_targetdir=png_targetdir,
+                              max_points=max_points)
 
 
 def plot_1d_interpolation(load_case, x_known, settlements_known, x_nodes,
-                          settlements_interpolated, png_targetdir='current'):
-    # Create axis object for 2D plot (Visualizing 1D interpolations)
-    fig, ax = plt.subplots()
+                          settlements_interpolated, png_targetdir='current',
+                          max_points=None):
+    '''
+    Plot the result of a 1D interpolation as settlement along the chainage.
+
+    See `plot_interpolation` for rendering and the `max_points` parameter.
+    '''
+    # Reduce the interpolated points to plot and sort them along the
+    # chainage for drawing the line
+    idx = plot_sample(settlements_interpolated, max_points)
+    idx = idx[np.argsort(x_nodes[idx], kind='stable')]
+    x_nodes, settlements_interpolated = x_nodes[idx], settlements_interpolated[idx]
+
+    # Get cleared axis object for 2D plot (Visualizing 1D interpolations)
+    ax = _plot_axes()
 
     # Plot known points
     ax.plot(x_known, settlements_known, '.',
@@ -429,17 +2460,125 @@ def plot_1d_interpolation(load_case, x_known, settlements_known, x_nodes,
     ax.set_title(f'Settlement interpolation for LC{load_case}')
     ax.set_xlabel('Chainage [m]')
     ax.set_ylabel('Settlement [mm]')
-    plt.legend()
+    ax.legend()
+
+    # Save figure as png file
+    _save_plot(ax, load_case, png_targetdir)
+
+
+def plot_sample(settlements_interpolated, max_points=None):
+    '''
+    Return sorted indices of the interpolated points to plot.
+
+    All points where the interpolation failed (nan) are included. The
+    remaining points are thinned out evenly to at most `max_points`.
+    '''
+    is_nan = np.isnan(settlements_interpolated)
+    idx_valid = np.flatnonzero(~is_nan)
 
+    if max_points is not None and len(idx_valid) > max_points:
+        # Take evenly spaced points among the valid ones
+        pick = np.linspace(0, len(idx_valid) - 1, max_points).astype(int)
+        idx_valid = idx_valid[pick]
+
+    return np.sort(np.concatenate((idx_valid, np.flatnonzero(is_nan))))
+
+
+# Axes reused for all plots rendered in each thread, keyed by projection
+_plot_axes_cache = threading.local()
+
+
+def _plot_axes(projection=None):
+    '''Return a cleared axes on a reused off-screen (Agg) figure.'''
+    axes = _plot_axes_cache.__dict__.setdefault('axes', {})
+    ax = axes.get(projection)
+
+    if ax is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        if projection == '3d':
+            from mpl_toolkits.mplot3d import Axes3D     # noqa
+
+        # Figure is created without pyplot, so it is never registered with
+        # an interactive backend and is kept alive only by this cache
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111, projection=projection)
+        axes[projection] = ax
+
+    ax.cla()
+    return ax
+
+
+def _save_plot(ax, load_case, png_targetdir):
+    '''Save the figure of `ax` as the png file for `load_case`.'''
     # Define name for png file to save
     png_name = f'LC{load_case}_settl_interp_plot.png'
 
     if png_targetdir == 'current':
         # Save figure
-        fig.savefig(png_name)
+        ax.figure.savefig(png_name)
     else:
         # Save figure in the folder that was input
-        fig.savefig(f'{png_targetdir}\\{png_name}')
+        ax.figure.savefig(os.path.join(png_targetdir, png_name))
+
+
+class SettlementPlotter:
+    '''
+    Plotting stage rendering interpolation plots in the background.
+
+    The interpolated points are downsampled in the calling process and the
+    plots are rendered to png files by a pool of worker processes, so
+    plotting does not block the interpolation and writing of the next
+    load cases. Each worker reuses its own off-screen figure.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes rendering plots. Defaults to 1. With 0 the
+        plots are rendered immediately in the calling process.
+    max_points : int, optional
+        Maximum number of successfully interpolated points to plot per
+        load case, see `plot_interpolation`. Defaults to 20000.
+    '''
+
+    def __init__(self, workers=1, max_points=20000):
+        self.max_points = max_points
+        self._pool = ProcessPoolExecutor(workers) if workers > 0 else None
+        self._futures = []
+
+    def plot(self, xycoords, node_no, lc, master_dict,
+             settlements_interpolated, png_targetdir='current'):
+        '''Plot load case `lc`, see `plot_interpolation`.'''
+        # Downsample here so only the plotted points are sent to the worker
+        x_nodes, y_nodes = xycoords
+        idx = plot_sample(settlements_interpolated, self.max_points)
+        args = ((x_nodes[idx], y_nodes[idx]), node_no[idx], lc,
+                {lc: master_dict[lc]}, settlements_interpolated[idx],
+                png_targetdir)
+
+        if self._pool is None:
+            plot_interpolation(*args)
+        else:
+            self._futures.append(self._pool.submit(plot_interpolation, *args))
+
+    def close(self):
+        '''Wait for all plots to be rendered and stop the workers.
+
+        Errors raised while rendering are re-raised here.
+        '''
+        with stage('plot_wait', n_plots=len(self._futures)):
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+            futures, self._futures = self._futures, []
+            for future in futures:
+                future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 
 def filter_nodes_for_Z(df, Zmax_allowable):
@@ -463,8 +2602,318 @@ def filter_nodes_for_Z(df, Zmax_allowable):
              named "Z [m]".''')
 
 
+class NodeFilter:
+    '''
+    Selection of the nodes to interpolate by their coordinates.
+
+    All tests are evaluated as boolean masks over the node arrays, and a
+    node is kept if it passes all of the given tests.
+
+    Parameters
+    ----------
+    z_max : float, optional
+        Only keep nodes with a Z-coordinate below `z_max`, e.g. to leave out
+        superstructure nodes above the foundation.
+    bbox : tuple, optional
+        Only keep nodes inside the box `(x_min, y_min, x_max, y_max)`.
+    polygon : list/numpy array, optional
+        Only keep nodes inside the polygon with these (x, y)-vertices.
+    master_dict : dict, optional
+        If given, only keep nodes inside the area covered by the known
+        points of at least one load case, i.e. inside the convex hull of the
+        known points of a 2D load case or within the X-range of a 1D load
+        case. Outside this area linear and cubic interpolation give NaN.
+
+    Attributes
+    ----------
+    known_key : str
+        Hash of the area covered by the known points, or `None` without
+        `master_dict`. The kept nodes of all load cases depend on it.
+    '''
+
+    def __init__(self, z_max=None, bbox=None, polygon=None, master_dict=None):
+        self.z_max = z_max
+        self.bbox = bbox
+        self.polygon = None if polygon is None \
+            else np.asarray(polygon, dtype=float)
+
+        # Triangulations of the distinct sets of known points in 2D load
+        # cases and X-ranges of the 1D load cases
+        self._hulls = {}
+        self._ranges = set()
+        for lc in master_dict or {}:
+            x_known = master_dict[lc]['X']
+            if '1d' in master_dict[lc]['int_method'].lower():
+                self._ranges.add((np.min(x_known), np.max(x_known)))
+            else:
+                y_known = master_dict[lc]['Y']
+                key = geometry_key(x_known, y_known)
+                if key not in self._hulls:
+                    from scipy.spatial import Delaunay
+                    self._hulls[key] = Delaunay(
+                        np.column_stack((x_known, y_known)))
+        self.within_known = master_dict is not None
+
+        self.known_key = None
+        if self.within_known:
+            self.known_key = hashlib.sha1(json.dumps(
+                [sorted(self._hulls), sorted(self._ranges)],
+                default=float).encode()).hexdigest()
+
+    def mask(self, x, y, z):
+        '''Return boolean mask of the nodes to keep.'''
+        x, y, z = (np.asarray(arr, dtype=float) for arr in (x, y, z))
+        keep = np.ones(len(x), dtype=bool)
+
+        if self.z_max is not None:
+            keep &= z < self.z_max
+
+        if self.bbox is not None:
+            x_min, y_min, x_max, y_max = self.bbox
+            keep &= (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+
+        if self.polygon is not None:
+            keep &= _in_polygon(x, y, self.polygon)
+
+        if self.within_known:
+            known = np.zeros(len(x), dtype=bool)
+            for x_min, x_max in self._ranges:
+                known |= (x >= x_min) & (x <= x_max)
+            for tri in self._hulls.values():
+                # Only test the nodes not already known to be covered
+                test = keep & ~known
+                known[test] = tri.find_simplex(
+                    np.column_stack((x[test], y[test]))) >= 0
+            keep &= known
+
+        return keep
+
+    def __call__(self, nodes):
+        '''Return the `(x, y, z, node_no)` arrays of the nodes to keep.'''
+        with stage('filter_nodes', n_nodes=len(nodes[0])) as info:
+            keep = self.mask(*nodes[:3])
+            info['n_kept'] = int(keep.sum())
+            if keep.all():
+                return nodes
+            return tuple(arr[keep] for arr in nodes)
+
+
+def _in_polygon(x, y, polygon):
+    '''Return mask of the points (x, y) inside `polygon` (even-odd rule).'''
+    inside = np.zeros(len(x), dtype=bool)
+    for (xa, ya), (xb, yb) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        # Flip the points left of where a horizontal ray crosses the edge
+        crosses = (ya > y) != (yb > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = xa + (y - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def process_load_case(lc, master_dict, x_nodes, y_nodes, node_no,
+                      settlements_interpolated=None, dir_target='current',
+                      plot_results=True, png_targetdir='current',
+                      dat_precision=None, skip_nan=False,
+                      plot_max_points=20000, dat_zero_tol=None,
+                      dat_collapse=False, dat_compress=False,
+                      dtype=np.float64, max_distance=None, neighbors=None,
+                      plotter=None, output=None, datfile=None):
+    '''Interpolate, report, write and plot a single load case.
+
+    Parameters
+    ----------
+    lc : int
+        Number of the load case in `master_dict` to process.
+    master_dict : dict
+        Dictionary storing all information about the load cases.
+    x_nodes, y_nodes : numpy array
+        Coordinates of the nodes to be interpolated.
+    node_no : numpy array
+        Node numbers of the nodes to be interpolated.
+    settlements_interpolated : numpy array, optional
+        Already interpolated settlements for the load case. If `None`, the
+        load case is interpolated here.
+    plotter : SettlementPlotter, optional
+        Plotting stage to hand the plot to. If `None`, the plot is rendered
+        immediately.
+    output : OutputPipeline, optional
+        Output stage to hand the writing of the dat file and the plot to.
+        If `None`, they are done before returning.
+    datfile : CombinedDatfile, optional
+        Combined dat file to add the load case to. If `None`, the load case
+        is written to its own dat file.
+
+    See `run_analysis` for the remaining parameters.
+    '''
+    # Set variables from dict for load case
+    x_known = master_dict[lc]['X']
+    y_known = master_dict[lc]['Y']
+    settlements_known = master_dict[lc]['Z']
+    int_method = master_dict[lc]['int_method'].lower()
+    lc_title = master_dict[lc]['title']
+
+    # Counts recorded with every stage of the load case
+    counts = dict(load_case=lc, n_nodes=len(node_no))
+
+    # Check for interpolation dimension and run analysis
+    if _dimension(int_method) == '1d':
+        if settlements_interpolated is None:
+            # Perform 1D interpolation (only X-coordinate varying)
+            with stage('interpolation', **counts):
+                interpolator = get_interpolator(
+                    x_known, method=interpolation_method(int_method),
+                    dtype=dtype)
+                interpolator.set_nodes(x_nodes)
+                settlements_interpolated = interpolator(settlements_known)
+
+    else:
+        if settlements_interpolated is None:
+            # Perform 2D interpolation (X,Y-coordinates varying)
+            with stage('interpolation', **counts):
+                settlements_interpolated = interpolate_settlements2D(
+                    x_known, y_known, settlements_known, x_nodes, y_nodes,
+                    method=interpolation_method(int_method), dtype=dtype,
+                    **interpolation_options(int_method, max_distance,
+                                            neighbors))
+
+    # Determine directory for saving the dat-file
+    if dir_target == 'current_dir':
+        # Get current working directory (where module is run from, i.e.
+        # Sofistik dir)
+        dir_target = os.getcwd()
+
+    # Print status report from interpolation and list the failed nodes
+    report_load_case(lc, x_nodes, y_nodes, node_no, settlements_interpolated,
+                     dir_target)
+
+    # Write interpolated field to .dat file as Teddy code
+    if datfile is None:
+        jobs = [('write_datfile', write_datfile,
+                 (lc, lc_title, node_no, settlements_interpolated, dir_target),
+                 dict(precision=dat_precision, skip_nan=skip_nan,
+                      zero_tol=dat_zero_tol, collapse=dat_collapse,
+                      compress=dat_compress))]
+    else:
+        jobs = [('write_datfile', datfile.add,
+                 (lc, lc_title, node_no, settlements_interpolated), {})]
+
+    # Plot results if was chosen to do so in the function call. With
+    # background plot workers the 'plot' stage only times handing the plot
+    # over, the rendering itself is timed by 'plot_wait'.
+    if plot_results:
+        if plotter is None:
+            plotter = SettlementPlotter(workers=0, max_points=plot_max_points)
+        jobs.append(('plot', plotter.plot,
+                     ((x_nodes, y_nodes), node_no, lc, master_dict,
+                      settlements_interpolated),
+                     dict(png_targetdir=png_targetdir)))
+
+    for name, func, args, kwargs in jobs:
+        if output is None:
+            _run_stage(name, counts, func, *args, **kwargs)
+        else:
+            output.submit(f'LC{lc} {name}', _run_stage, name, counts, func,
+                          *args, **kwargs)
+
+
+def _run_stage(name, info, func, *args, **kwargs):
+    '''Call `func` as stage `name` with the counts in `info`.'''
+    with stage(name, **info):
+        return func(*args, **kwargs)
+
+
+class OutputPipeline:
+    '''
+    Output stage writing files in background threads.
+
+    Output jobs (e.g. writing a dat file or rendering a plot) are put on a
+    bounded queue and run by writer threads, so the next load cases can be
+    interpolated while the files are written, e.g. to a slow network share.
+    When the queue is full, `submit` waits for a free slot, which bounds the
+    number of results held in memory.
+
+    Errors raised by the jobs are collected instead of stopping the writer
+    threads, and are reported by `report_errors` at the end of the run.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of writer threads. Defaults to 1. With 0, jobs are run
+        immediately in the calling thread and errors are raised directly.
+    maxsize : int, optional
+        Maximum number of jobs waiting in the queue. Defaults to 4.
+    '''
+
+    def __init__(self, workers=1, maxsize=4):
+        self.errors = []
+        self._queue = queue.Queue(maxsize)
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, label, func, *args, **kwargs):
+        '''Queue the call `func(*args, **kwargs)`, described by `label`.'''
+        if not self._threads:
+            func(*args, **kwargs)
+            return
+        self._queue.put((label, func, args, kwargs))
+
+    def _work(self):
+        '''Run queued jobs until the stop signal (`None`) is received.'''
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            label, func, args, kwargs = job
+            try:
+                func(*args, **kwargs)
+            except Exception as error:
+                self.errors.append((label, error))
+
+    def close(self):
+        '''Wait for all queued jobs to finish and stop the threads.'''
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def report_errors(self):
+        '''Print the failed jobs and raise the first error, if any.'''
+        if not self.errors:
+            return
+
+        failed = '\n'.join(f'    {label}: {type(error).__name__}: {error}'
+                           for label, error in self.errors)
+        print(f'''--------------------------------------------
+OUTPUT ERRORS
+--------------------------------------------
+{failed}
+-------------------------------------------''')
+        raise RuntimeError(
+            f'{len(self.errors)} output job(s) failed, the first was '
+            f'{self.errors[0][0]}.') from self.errors[0][1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 def run_analysis(master_dict, dir_lookup='current', dir_target='current',
-                 plot_results=True, png_targetdir='current'):
+                 plot_results=True, png_targetdir='current',
+                 dat_precision=None, skip_nan=False, workers=1,
+                 plot_max_points=20000, plot_workers=1, chunk_size=None,
+                 report_json=True, print_timings=False, report=None,
+                 incremental=True,
+                 nodes_filename='nodes_to_be_interpolated.xlsx', z_max=None,
+                 bbox=None, polygon=None, within_known=False,
+                 output_workers=1, output_queue_size=4, dat_zero_tol=None,
+                 dat_collapse=False, dat_compress=False,
+                 combined_datfile=False, dtype=np.float64, max_distance=None,
+                 neighbors=None):
     '''Run interpolation analysis and write dat file in Teddy input language.
 
     Parameters
@@ -486,87 +2935,1049 @@ def run_analysis(master_dict, dir_lookup='current', dir_target='current',
         as png files. This parameter only takes effect if `plot_results`
         is `True`.
         Defaults to current working directory.
+    dat_precision : int, optional
+        Number of decimals for settlement values in the dat files.
+        Defaults to `None`, i.e. full precision.
+    skip_nan : bool, optional
+        Whether to leave nodes that failed to interpolate out of the dat
+        files. Defaults to `False`.
+    workers : int, optional
+        Number of processes to run load cases in. Defaults to 1, which runs
+        all load cases one after another in this process. `None` uses one
+        process per CPU core.
+    plot_max_points : int, optional
+        Maximum number of interpolated points to plot per load case. Nodes
+        where interpolation failed are always plotted. Defaults to 20000.
+    plot_workers : int, optional
+        Number of background processes rendering plots while the load
+        cases are interpolated and written. Defaults to 1. With 0, plots
+        are rendered before moving on to the next load case. With more
+        than one `workers`, each worker renders its own plots.
+    chunk_size : int, optional
+        If given, run in streaming mode: the nodes are read from the node
+        file in chunks of this size, and each chunk is interpolated and
+        appended to the dat files before the next one is read. Peak memory
+        then depends on the chunk size rather than the number of nodes.
+        Streaming mode runs in a single process (`workers` must be 1).
+        Defaults to `None`, which reads all nodes at once.
+    report_json : bool, optional
+        Whether to write a JSON run report with the wall time, peak memory
+        and node and load case counts of every stage to
+        'sofset_run_report.json' next to the dat files. Defaults to `True`.
+    print_timings : bool, optional
+        Whether to print a summary table of the stages after the status
+        reports. Defaults to `False`.
+    report : RunReport, optional
+        Report to collect the stage records in, e.g. to inspect them after
+        the run. Defaults to `None`, which uses a new report.
+    incremental : bool, optional
+        Whether to skip load cases whose inputs and output files are
+        unchanged since the last run into `dir_target`, see Notes.
+        Defaults to `True`.
+    nodes_filename : str, optional
+        Name of the file in `dir_lookup` with the nodes to interpolate, in
+        one of the formats of `read_nodes`. Defaults to
+        'nodes_to_be_interpolated.xlsx'.
+    z_max : float, optional
+        Only interpolate nodes with a Z-coordinate below `z_max`, e.g. to
+        leave out superstructure nodes. Defaults to `None`, i.e. no limit.
+    bbox : tuple, optional
+        Only interpolate nodes inside the box `(x_min, y_min, x_max,
+        y_max)`. Defaults to `None`.
+    polygon : list, optional
+        Only interpolate nodes inside the polygon with these (x, y)-vertices.
+        Defaults to `None`.
+    within_known : bool, optional
+        Whether to only interpolate nodes inside the area covered by the
+        known points of at least one load case, see `NodeFilter`. Defaults
+        to `False`.
+    output_workers : int, optional
+        Number of threads writing the dat files and handing over the plots
+        while the next load cases are interpolated. Defaults to 1. With 0,
+        the output of each load case is written before moving on. Only
+        used with one `workers` and without `chunk_size`.
+    output_queue_size : int, optional
+        Maximum number of output jobs waiting for the writer threads. The
+        interpolation waits when the queue is full, which bounds the memory
+        held by results not yet written. Defaults to 4.
+    dat_zero_tol : float, optional
+        Leave nodes with an absolute settlement of at most `dat_zero_tol`
+        out of the dat files, see `format_poin_lines`. Defaults to `None`,
+        which writes all nodes.
+    dat_collapse : bool, optional
+        Whether to write runs of consecutively numbered nodes with the same
+        settlement as one `POIN` line. Defaults to `False`.
+    dat_compress : bool, optional
+        Whether to write the dat files gzip-compressed ('.dat.gz'). They
+        have to be decompressed before they are applied. Defaults to
+        `False`.
+    combined_datfile : bool, optional
+        Whether to write all load cases into one SOFILOAD block in
+        'settlements_combined.dat' instead of one dat file per load case,
+        see `CombinedDatfile`. Requires one `workers` and no `chunk_size`.
+        Defaults to `False`.
+    dtype : numpy dtype, optional
+        Data type of the node coordinates held by the interpolators and of
+        the interpolated settlements. `np.float32` roughly halves the
+        memory of the interpolation for large models, at a precision of
+        about 7 significant digits. Defaults to float64.
+    max_distance : float, optional
+        Largest distance from the nearest known point that load cases with
+        the 'idw' or 'rbf' method extrapolate to. Nodes further away get
+        NaN. Load cases can set their own in `int_method`, see
+        `interpolation_options`. Defaults to `None`, i.e. no limit.
+    neighbors : int, optional
+        Number of nearest known points used by load cases with the 'idw' or
+        'rbf' method, unless set in their `int_method`. Defaults to `None`,
+        which uses the default of `Interpolator2D`.
+
+    Returns
+    -------
+    RunReport
+        Records of all stages of the run.
 
     Notes
     -----
     Current working directory will in most cases be the the directory
-    where the .sofistik (ssd) file is located.  
+    where the .sofistik (ssd) file is located.
+
+    With more than one worker, the node arrays are placed in shared memory
+    and `master_dict` is sent once to each worker process. Every load case
+    writes its own files, and the status reports are printed in the order
+    of the load cases in `master_dict` regardless of which finishes first.
+
+    In incremental mode, a hash of the inputs of each load case (its known
+    points and settlements, title, interpolation method, the contents of
+    the node file, the output options and node filters, and the sofset
+    version) is stored in 'sofset_manifest.json' in `dir_target` together
+    with the size and modification time of its output files. With
+    `within_known`, the hash also covers the known points of all load
+    cases, as they decide which nodes are kept. Load cases with the same hash
+    whose output files are untouched are skipped on the next run.
     '''
 
-    for lc in master_dict:
+    if dir_lookup == 'current':
+        # Get directory where script is run from
+        dir_lookup = os.getcwd()
 
-        # Set variables from dict for load case
-        title = master_dict[lc]['title']
-        x_known = master_dict[lc]['X']
-        y_known = master_dict[lc]['Y']
-        settlements_known = master_dict[lc]['Z']
-        int_method = master_dict[lc]['int_method'].lower()
-        lc_title = master_dict[lc]['title']
+    dir_out = os.getcwd() if dir_target in ['current', 'current_dir'] \
+        else dir_target
+
+    if report is None:
+        report = RunReport()
+
+    options = dict(dir_target=dir_target, plot_results=plot_results,
+                   png_targetdir=png_targetdir, dat_precision=dat_precision,
+                   skip_nan=skip_nan, plot_max_points=plot_max_points,
+                   dat_zero_tol=dat_zero_tol, dat_collapse=dat_collapse,
+                   dat_compress=dat_compress, dtype=np.dtype(dtype).name,
+                   max_distance=max_distance, neighbors=neighbors)
+
+    # Nodes left out of the interpolation and the dat files
+    filters = dict(z_max=z_max, bbox=bbox, polygon=polygon,
+                   within_known=within_known)
+    node_filter = None
+    if any(value not in [None, False] for value in filters.values()):
+        node_filter = NodeFilter(
+            z_max=z_max, bbox=bbox, polygon=polygon,
+            master_dict=master_dict if within_known else None)
+        # The nodes kept depend on the known points of all load cases
+        filters['within_known'] = node_filter.known_key or False
+
+    combined_name = None
+    if combined_datfile:
+        if workers != 1 or chunk_size is not None:
+            raise ValueError('A combined dat file requires workers=1 and no '
+                             'chunk_size.')
+        combined_name = os.path.join(dir_out, 'settlements_combined.dat')
+        # Name of the file as written, relative to `dir_out`
+        combined_file = os.path.basename(combined_name) \
+            + ('.gz' if dat_compress else '')
+
+    # Record every stage of the run, including those in the readers
+    with report, stage('run_analysis', n_load_cases=len(master_dict)):
+        manifest_path = os.path.join(dir_out, 'sofset_manifest.json')
+        changed = master_dict
+        if incremental:
+            with stage('check_manifest') as info:
+                manifest = read_manifest(manifest_path)
+                node_key = file_key(os.path.join(dir_lookup, nodes_filename))
+                keys = {lc: load_case_key(master_dict[lc], node_key,
+                                          dict(options, **filters,
+                                               combined=combined_datfile))
+                        for lc in master_dict}
+                changed = {lc: master_dict[lc] for lc in master_dict
+                           if not _is_up_to_date(manifest.get(str(lc)),
+                                                 keys[lc])}
+                if combined_datfile and changed:
+                    # The combined file is rewritten with all load cases
+                    changed = master_dict
+                info['n_load_cases'] = len(master_dict)
+                info['n_changed'] = len(changed)
+
+            for lc in master_dict:
+                if lc not in changed:
+                    print(f'''
+    Load case {lc} is unchanged since the last run, skipped.''')
+
+        if changed:
+            try:
+                _run_analysis(changed, dir_lookup, nodes_filename,
+                              node_filter, workers, plot_workers, chunk_size,
+                              options, output_workers=output_workers,
+                              output_queue_size=output_queue_size,
+                              combined_name=combined_name)
+            finally:
+                # Only keep the set-up for the known points cached
+                interpolator_cache.clear_nodes()
+
+        if incremental:
+            # Record the new hashes, output files and number of nan values
+            # of the load cases run
+            n_nan = {record['load_case']: record['n_nan']
+                     for record in report.records
+                     if record['stage'] == 'status_report'}
+            for lc in changed:
+                manifest[str(lc)] = dict(
+                    key=keys[lc], n_nan=n_nan.get(lc),
+                    outputs=_output_stats(
+                        lc, dir_out, png_targetdir, plot_results,
+                        dat_file=(combined_file if combined_datfile
+                                  else datfile_name(lc, dat_compress))))
+            write_manifest(manifest_path, manifest)
+
+    if report_json:
+        report.write_json(os.path.join(dir_out, 'sofset_run_report.json'),
+                          load_cases=list(master_dict), workers=workers,
+                          chunk_size=chunk_size)
+
+    if print_timings:
+        print(f'''
+    Run report
+    ----------
+{report.summary()}''')
+
+    return report
+
+
+def load_case_key(load_case, node_key, options):
+    '''
+    Return a hash of everything the output files of a load case depend on.
+
+    Parameters
+    ----------
+    load_case : dict
+        Data of the load case in the master dictionary.
+    node_key : str
+        Hash of the node file, see `file_key`.
+    options : dict
+        Output options passed on from `run_analysis`.
+    '''
+    h = hashlib.sha1()
+    h.update(geometry_key(load_case['X'], load_case['Y'],
+                          load_case['Z']).encode())
+    h.update(json.dumps([load_case['title'], load_case['int_method'],
+                         node_key, __version__, options],
+                        sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+# Hashes of files already read in this session, keyed by absolute path
+_file_key_cache = {}
+
+
+def file_key(file_name):
+    '''Return a hash of the contents of `file_name`.'''
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _file_key_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            h.update(block)
+
+    _file_key_cache[path] = (signature, h.hexdigest())
+    return h.hexdigest()
+
+
+def read_manifest(manifest_path):
+    '''Return the load case entries of a manifest, empty if missing.'''
+    try:
+        with open(manifest_path) as file:
+            return json.load(file)['load_cases']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def write_manifest(manifest_path, entries):
+    '''Write the load case entries of a manifest.'''
+    with open(manifest_path, 'w') as file:
+        json.dump(dict(version=__version__, load_cases=entries), file,
+                  indent=2)
+
+
+def _output_files(lc, dir_out, png_targetdir, plot_results, dat_file=None):
+    '''Return the paths of the files written for load case `lc`.'''
+    if dat_file is None:
+        dat_file = datfile_name(lc)
+    files = [os.path.join(dir_out, dat_file)]
+    if plot_results:
+        png_dir = os.getcwd() if png_targetdir == 'current' else png_targetdir
+        files.append(os.path.join(png_dir, f'LC{lc}_settl_interp_plot.png'))
+    return [os.path.abspath(file) for file in files]
+
+
+def _output_stats(lc, dir_out, png_targetdir, plot_results, dat_file=None):
+    '''Return modification time and size of the output files of `lc`.'''
+    stats = {}
+    for path in _output_files(lc, dir_out, png_targetdir, plot_results,
+                              dat_file):
+        stat = os.stat(path)
+        stats[path] = [stat.st_mtime_ns, stat.st_size]
+    return stats
+
+
+def _is_up_to_date(entry, key):
+    '''Return whether a manifest entry has `key` and untouched outputs.'''
+    if entry is None or entry.get('key') != key:
+        return False
+    for path, (mtime_ns, size) in entry['outputs'].items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+            return False
+    return True
+
+
+def _run_analysis(master_dict, dir_lookup, nodes_filename, node_filter,
+                  workers, plot_workers, chunk_size, options,
+                  output_workers=1, output_queue_size=4, combined_name=None):
+    '''Run the stages of `run_analysis` with the given `options`.'''
+    if chunk_size is not None:
+        if workers != 1:
+            raise ValueError('Streaming mode (chunk_size) requires workers=1.')
+        node_chunks = iter_nodes(dir_lookup=dir_lookup,
+                                 filename=nodes_filename,
+                                 chunk_size=chunk_size)
+        if node_filter is not None:
+            # Filter each chunk and skip chunks without any nodes left
+            node_chunks = (chunk for chunk in map(node_filter, node_chunks)
+                           if len(chunk[3]))
+        run_load_cases_streaming(master_dict, node_chunks,
+                                 plot_workers=plot_workers, **options)
+        return
+
+    # Read (x, y)-coordinates and numbers of nodes to be interpolated
+    # (read from Excel, or from its binary sidecar if unchanged)
+    nodes = load_nodes(dir_lookup=dir_lookup, filename=nodes_filename)
+    if node_filter is not None:
+        nodes = node_filter(nodes)
+    x_nodes, y_nodes, _, node_no = nodes
+
+    if workers is None:
+        workers = os.cpu_count()
+    workers = min(workers, len(master_dict))
+
+    if workers > 1:
+        _run_load_cases_parallel(master_dict, (x_nodes, y_nodes, node_no),
+                                 options, workers)
+        return
+
+    # Render plots in the background while the next load cases are handled
+    plotter = None
+    if options['plot_results']:
+        plotter = SettlementPlotter(workers=plot_workers,
+                                    max_points=options['plot_max_points'])
+
+    # Write the output of each load case in writer threads while the next
+    # load cases are interpolated
+    output = OutputPipeline(workers=output_workers, maxsize=output_queue_size)
+
+    # All load cases are added to one dat file in a combined run
+    datfile = None
+    if combined_name is not None:
+        datfile = CombinedDatfile(
+            combined_name, compress=options['dat_compress'],
+            precision=options['dat_precision'],
+            skip_nan=options['skip_nan'], zero_tol=options['dat_zero_tol'],
+            collapse=options['dat_collapse'])
+
+    try:
+        # Load cases sharing the same known points are interpolated in one
+        # batch when the first of them is reached
+        for lc, settlements in iter_load_cases(
+                master_dict, x_nodes, y_nodes, dtype=options['dtype'],
+                max_distance=options['max_distance'],
+                neighbors=options['neighbors']):
+            process_load_case(lc, master_dict, x_nodes, y_nodes, node_no,
+                              settlements_interpolated=settlements,
+                              plotter=plotter, output=output,
+                              datfile=datfile, **options)
+    finally:
+        output.close()
+        if datfile is not None:
+            datfile.close()
+        if plotter is not None:
+            plotter.close()
+
+    output.report_errors()
+
+
+def sweep_load_cases(master_dict, combinations, x_nodes, y_nodes):
+    '''
+    Return interpolated settlements of load cases combined from base cases.
+
+    All interpolation methods are linear in the known settlements, so the
+    interpolated field of a linear combination of settlement fields is the
+    same combination of the interpolated fields. Each base load case is
+    therefore interpolated once, and all combinations are evaluated as one
+    matrix product of the combination factors and the base fields.
+
+    Parameters
+    ----------
+    master_dict : dict
+        Dictionary with the base load cases, see `read_known_settlements`.
+    combinations : dict
+        Combined load cases by load case number, each a dict with a 'title'
+        and the 'factors' of the base load cases, e.g.
+        `{201: {'title': '1.5 x trough', 'factors': {124: 1.5}}}`.
+    x_nodes, y_nodes : numpy array
+        Coordinates of the nodes to be interpolated.
+
+    Returns
+    -------
+    dict
+        Interpolated settlements for each combined load case, keyed by load
+        case number in the order of `combinations`.
+
+    Notes
+    -----
+    A node is nan in a combined load case if it is nan in any base load
+    case with a non-zero factor.
+    '''
+    for comb in combinations:
+        unknown = set(combinations[comb]['factors']) - set(master_dict)
+        if unknown:
+            raise KeyError(f'''Load case {comb} combines load cases
+            {sorted(unknown, key=str)} that are not in master_dict.''')
+
+    # Interpolate only the base load cases used by the combinations
+    used = [lc for lc in master_dict
+            if any(combinations[comb]['factors'].get(lc, 0)
+                   for comb in combinations)]
+    results = interpolate_load_cases({lc: master_dict[lc] for lc in used},
+                                     x_nodes, y_nodes)
+    base = np.vstack([results.pop(lc) for lc in used]) if used else \
+        np.empty((0, len(x_nodes)))
+
+    # Matrix of factors with one row per combination and one column per
+    # used base load case
+    factors = np.array([[combinations[comb]['factors'].get(lc, 0)
+                         for lc in used] for comb in combinations],
+                       dtype=float).reshape(len(combinations), len(used))
+
+    with stage('sweep', n_load_cases=len(combinations), n_base=len(used),
+               n_nodes=len(x_nodes)):
+        # Combine all load cases at once, ignoring nan values in base cases
+        # that a combination does not use
+        nan = np.isnan(base)
+        combined = factors @ np.where(nan, 0, base)
+        combined[(factors != 0).astype(float) @ nan > 0] = np.nan
+
+    return dict(zip(combinations, combined))
+
+
+def scaled_combinations(base_lc, scales, first_lc, title=None):
+    '''
+    Return combinations scaling one base load case by each of `scales`.
+
+    Parameters
+    ----------
+    base_lc : int
+        Number of the base load case.
+    scales : list
+        Scale factors, e.g. `[0.5, 1.0, 1.5]`.
+    first_lc : int
+        Load case number of the first combined load case. The following
+        load cases are numbered consecutively.
+    title : str, optional
+        Title of the base load case used in the titles of the combined load
+        cases. Defaults to 'LC{base_lc}'.
+
+    Returns
+    -------
+    dict
+        Combinations for `sweep_load_cases` and `run_sweep`.
+    '''
+    title = f'LC{base_lc}' if title is None else title
+    return {first_lc + i: {'title': f'{scale:g} x {title}',
+                           'factors': {base_lc: scale}}
+            for i, scale in enumerate(scales)}
 
-        if dir_lookup == 'current':
-            # Get directory where script is run from
-            dir_lookup = os.getcwd()
 
-        # Read (x, y)-coordinates and numbers of nodes to be interpolated
-        # (read from Excel)
-        x_nodes, y_nodes, _, node_no = read_excel_nodes(dir_lookup=dir_lookup)
+def run_sweep(master_dict, combinations, dir_lookup='current',
+              dir_target='current', dat_precision=None, skip_nan=False,
+              nodes_filename='nodes_to_be_interpolated.xlsx',
+              combined_datfile=False, output_workers=1, output_queue_size=4):
+    '''
+    Write dat files of load cases combined from the base load cases.
+
+    Each base load case is interpolated once and all combined load cases
+    are derived from the interpolated fields in one pass, see
+    `sweep_load_cases`. A status report is printed for every combined load
+    case and the dat files are handed to the writer threads of an
+    `OutputPipeline`, or all written into one SOFILOAD block with
+    `combined_datfile`. No plots are made.
+
+    Parameters
+    ----------
+    master_dict : dict
+        Dictionary with the base load cases, see `read_known_settlements`.
+    combinations : dict
+        Combined load cases, see `sweep_load_cases` and
+        `scaled_combinations`.
+    combined_datfile : bool, optional
+        Whether to write all combined load cases into
+        'settlements_combined.dat' instead of one dat file per load case,
+        see `CombinedDatfile`. Defaults to `False`.
+
+    See `run_analysis` for the remaining parameters.
+
+    Returns
+    -------
+    list
+        Paths of the written dat files.
+    '''
+    if dir_lookup == 'current':
+        # Get directory where script is run from
+        dir_lookup = os.getcwd()
+    if dir_target == 'current':
+        dir_target = os.getcwd()
+
+    x_nodes, y_nodes, _, node_no = load_nodes(dir_lookup=dir_lookup,
+                                              filename=nodes_filename)
+    results = sweep_load_cases(master_dict, combinations, x_nodes, y_nodes)
+    interpolator_cache.clear_nodes()
+
+    datfile = None
+    if combined_datfile:
+        datfile = CombinedDatfile(
+            os.path.join(dir_target, 'settlements_combined.dat'),
+            precision=dat_precision, skip_nan=skip_nan)
+        file_names = [datfile.file_name]
+    else:
+        file_names = [os.path.join(dir_target, datfile_name(lc))
+                      for lc in results]
 
-        # Extract chosen method for interpolation
-        if 'linear' in int_method:
-            # Set method to linear interpolation
-            method = 'linear'
-        elif 'cubic' in int_method:
-            # Set method to cubic interpolation
-            method = 'cubic'
+    # Write the dat files in writer threads while the next status reports
+    # are made
+    output = OutputPipeline(workers=output_workers, maxsize=output_queue_size)
+    try:
+        for lc, settlements in results.items():
+            counts = dict(load_case=lc, n_nodes=len(node_no))
+            report_load_case(lc, x_nodes, y_nodes, node_no, settlements,
+                             dir_target)
+            if datfile is None:
+                output.submit(f'LC{lc} write_datfile', _run_stage,
+                              'write_datfile', counts, write_datfile, lc,
+                              combinations[lc]['title'], node_no, settlements,
+                              dir_target, precision=dat_precision,
+                              skip_nan=skip_nan)
+            else:
+                output.submit(f'LC{lc} write_datfile', _run_stage,
+                              'write_datfile', counts, datfile.add, lc,
+                              combinations[lc]['title'], node_no, settlements)
+    finally:
+        output.close()
+        if datfile is not None:
+            datfile.close()
+
+    output.report_errors()
+    return file_names
+
+
+def run_load_cases_streaming(master_dict, node_chunks, dir_target='current',
+                             plot_results=True, png_targetdir='current',
+                             dat_precision=None, skip_nan=False,
+                             plot_max_points=20000, dat_zero_tol=None,
+                             dat_collapse=False, dat_compress=False,
+                             dtype=np.float64, max_distance=None,
+                             neighbors=None, plot_workers=1):
+    '''Interpolate all load cases chunk by chunk and stream the dat files.
+
+    The interpolators are set up once from the known points. Each chunk of
+    nodes is then interpolated for every load case and appended directly to
+    the dat files, so only one chunk of results is held in memory. The
+    nodes where interpolation failed are appended to the nan node files in
+    the same way. The status reports and plots are based on evenly thinned
+    samples of at most `plot_max_points` of the failed nodes and of the
+    remaining nodes, so memory does not grow with the number of nodes.
 
-        # Check for interpolation dimension and run analysis
-        if '1d' in int_method:
+    Parameters
+    ----------
+    master_dict : dict
+        Dictionary storing all information about the load cases.
+    node_chunks : iterable
+        Chunks of `(x_nodes, y_nodes, z_nodes, node_no)` arrays, e.g. from
+        `iter_excel_nodes`.
 
-            # Perform 1D interpolation and store results (only X-coordinate varying)
-            f_int = interp1d(x_known, settlements_known, kind=method,
-                             bounds_error=False)
+    See `run_analysis` for the remaining parameters.
+    '''
+    if dir_target in ['current', 'current_dir']:
+        dir_target = os.getcwd()
 
-            # Sort X-coordinates of nodes and node numbers
-            sorted_indices = x_nodes.argsort()
-            x_nodes = x_nodes[sorted_indices]
-            node_no = node_no[sorted_indices]
+    # Set up interpolators once for all chunks
+    groups = group_load_cases(master_dict, dtype=dtype,
+                              max_distance=max_distance, neighbors=neighbors)
+
+    # Number of interpolated nodes and nan values, and sampled results of
+    # the valid and the failed nodes for each load case
+    n_total = dict.fromkeys(master_dict, 0)
+    n_nan = dict.fromkeys(master_dict, 0)
+    samples = {lc: (_ThinnedSample(plot_max_points if plot_results else 0),
+                    _ThinnedSample(plot_max_points))
+               for lc in master_dict}
+
+    with ExitStack() as stack:
+        # Drop the nodes of the last chunk from the cached interpolators
+        stack.callback(interpolator_cache.clear_nodes)
+
+        # Open all dat files and write their headers
+        files = {}
+        for lc in master_dict:
+            file_name = os.path.join(dir_target, datfile_name(lc, dat_compress))
+            files[lc] = stack.enter_context(open_datfile(file_name))
+            files[lc].write(datfile_header(lc, master_dict[lc]['title']))
+
+        # Files with the failed nodes are opened once the first one fails
+        nan_files = {}
+
+        for chunk, (x_nodes, y_nodes, _, node_no) in enumerate(
+                _timed_chunks(node_chunks)):
+            counts = dict(chunk=chunk, n_nodes=len(node_no),
+                          n_load_cases=len(master_dict))
+
+            # Interpolate all load cases for the chunk
+            results = {}
+            with stage('interpolation', **counts):
+                for interpolator, lcs, z_stacked in groups:
+                    interpolator.set_nodes(x_nodes, y_nodes)
+                    results.update(zip(lcs, interpolator(z_stacked)))
+
+            with stage('write_datfile', **counts):
+                for lc in master_dict:
+                    # Append chunk to dat file
+                    settlements = results.pop(lc)
+                    files[lc].write(format_poin_lines(
+                        node_no, settlements, precision=dat_precision,
+                        skip_nan=skip_nan, zero_tol=dat_zero_tol,
+                        collapse=dat_collapse))
+                    n_total[lc] += len(settlements)
+
+                    # Append failed nodes to their file
+                    is_nan = np.isnan(settlements)
+                    if is_nan.any():
+                        if lc not in nan_files:
+                            nan_files[lc] = stack.enter_context(open(
+                                os.path.join(dir_target, nan_nodes_name(lc)),
+                                'w'))
+                            nan_files[lc].write(NAN_NODES_HEADER)
+                        nan_files[lc].write(nan_node_rows(
+                            node_no, x_nodes, y_nodes, is_nan))
+                        n_nan[lc] += int(is_nan.sum())
+
+                    # Keep samples for reporting
+                    for sample, mask in zip(samples[lc], [~is_nan, is_nan]):
+                        sample.add(x_nodes[mask], y_nodes[mask],
+                                   node_no[mask], settlements[mask])
+
+        for file in files.values():
+            file.write('END')
+
+    plotter = None
+    if plot_results:
+        plotter = SettlementPlotter(workers=plot_workers,
+                                    max_points=plot_max_points)
 
-            # Extract interpolated settlement values at desired X-coords
-            settlements_interpolated = f_int(x_nodes)
+    try:
+        for lc in master_dict:
+            # Join the samples of the valid and the failed nodes
+            x_s, y_s, node_s, settlements_s = (
+                np.concatenate(arrays) for arrays in zip(
+                    *(sample.arrays() for sample in samples.pop(lc))))
+
+            counts = dict(load_case=lc, n_nodes=n_total[lc])
+            report_load_case(lc, x_s, y_s, node_s, settlements_s, dir_target,
+                             n_total=n_total[lc], n_nan=n_nan[lc])
+            if plotter is not None:
+                with stage('plot', **counts):
+                    plotter.plot((x_s, y_s), node_s, lc, master_dict,
+                                 settlements_s, png_targetdir=png_targetdir)
+    finally:
+        if plotter is not None:
+            plotter.close()
+
+
+class _ThinnedSample:
+    '''
+    Evenly thinned sample of at most `max_points` points of a stream.
 
-        elif '2d' in int_method:
-            # Perform linear 2D interpolation (X,Y-coordinates varying)
-            settlements_interpolated = interpolate_settlements2D(
-                x_known, y_known, settlements_known, x_nodes, y_nodes,
-                method=method)
+    Every `stride`-th point of the stream is kept. When more than
+    `max_points` are kept, the stride is doubled and every other point in
+    the sample is dropped. With `max_points=None` all points are kept.
+    The sampled arrays are empty arrays of `dtypes` until points are added.
+    '''
 
+    def __init__(self, max_points, dtypes=(float, float, np.int64, float)):
+        self.max_points = max_points
+        self.stride = 1
+        self.n_seen = 0
+        self._index = np.empty(0, dtype=np.int64)
+        self._arrays = [np.empty(0, dtype=dtype) for dtype in dtypes]
+
+    def add(self, *arrays):
+        '''Add the next points of the stream, given as arrays of equal length.'''
+        index = np.arange(self.n_seen, self.n_seen + len(arrays[0]))
+        self.n_seen += len(index)
+        if self.max_points == 0:
+            keep = np.zeros(len(index), dtype=bool)
         else:
-            raise Exception(
-                f'''The interpolation method ("int_method") needs to specify
-                1D or 2D and linear or cubic. The input was {int_method}''')
+            keep = index % self.stride == 0
+        arrays = [np.concatenate((sampled, arr[keep]))
+                  for sampled, arr in zip(self._arrays, arrays)]
+        self._index = np.concatenate((self._index, index[keep]))
+        self._arrays = arrays
+
+        if self.max_points is not None:
+            while len(self._index) > self.max_points:
+                # Drop every other point of the sample
+                self.stride *= 2
+                keep = self._index % self.stride == 0
+                self._index = self._index[keep]
+                self._arrays = [arr[keep] for arr in self._arrays]
+
+    def arrays(self):
+        '''Return the arrays of the sampled points.'''
+        return self._arrays
+
+
+def _timed_chunks(node_chunks):
+    '''Yield from `node_chunks`, timing the reading of each chunk.'''
+    node_chunks = iter(node_chunks)
+    chunk = 0
+    while True:
+        with stage('read_node_chunk', chunk=chunk) as info:
+            nodes = next(node_chunks, None)
+            info['n_nodes'] = 0 if nodes is None else len(nodes[-1])
+        if nodes is None:
+            return
+        yield nodes
+        chunk += 1
+
+
+# State of a worker process in a parallel run, set by `_init_worker`
+_worker_state = {}
+
+
+def _run_load_cases_parallel(master_dict, nodes, options, workers):
+    '''Process load cases in a pool of `workers` processes.'''
+    blocks, specs = _share_arrays(nodes)
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(master_dict, specs, options)) as pool:
+            # Print status reports in load case order as they become ready
+            # and pass the stage records of the workers on to the hooks
+            for report, records in pool.map(_worker_load_case,
+                                            list(master_dict)):
+                print(report, end='')
+                for record in records:
+                    for hook in list(_stage_hooks):
+                        hook(record)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def _init_worker(master_dict, specs, options):
+    '''Attach a worker process to the shared node arrays.'''
+    blocks, nodes = _attach_arrays(specs)
+    plotter = SettlementPlotter(workers=0, max_points=options['plot_max_points'])
+    _worker_state.update(master_dict=master_dict, blocks=blocks, nodes=nodes,
+                         options=dict(options, plotter=plotter))
+
+
+def _worker_load_case(lc):
+    '''Process load case `lc` in a worker.
+
+    Returns the status report and the stage records of the load case.
+    '''
+    report = io.StringIO()
+    with RunReport() as run_report, redirect_stdout(report):
+        process_load_case(lc, _worker_state['master_dict'],
+                          *_worker_state['nodes'], **_worker_state['options'])
+    return report.getvalue(), run_report.records
+
+
+def _share_arrays(arrays):
+    '''Return shared memory blocks holding copies of `arrays`.
+
+    Returns the blocks, which must be kept alive and unlinked by the
+    caller, and a picklable (name, shape, dtype) spec for each array.
+    '''
+    blocks, specs = [], []
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        specs.append((shm.name, arr.shape, arr.dtype.str))
+    return blocks, specs
+
+
+def _attach_arrays(specs):
+    '''Return shared memory blocks and read-only arrays from `specs`.'''
+    blocks, arrays = [], []
+    for name, shape, dtype in specs:
+        shm = shared_memory.SharedMemory(name=name)
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        arr.setflags(write=False)
+        blocks.append(shm)
+        arrays.append(arr)
+    return blocks, arrays
+
+
+# Input workbook of a model, relative to the model folder
+DEFAULT_INPUT = os.path.join('Settlement_interpolation',
+                             'known_settlement_values.xlsm')
+
+
+def main(argv=None):
+    '''
+    Command line entry point running the analysis for many model folders.
+
+    The model folders are processed in a pool of worker processes. Each
+    worker imports the libraries once and keeps its caches between the
+    models it processes. The status reports of each model are written to
+    'sofset_log.txt' in the model folder, and a summary table of all models
+    is printed at the end. Run `sofset --help` for the options.
 
-        # Print status report from interpolation
-        print_status_report(x_nodes, y_nodes, settlements_interpolated, lc)
+    Returns
+    -------
+    int
+        Exit code: 0 if all load cases were interpolated without nan
+        values, 1 if any load case has nan values and 2 if any model
+        failed.
+    '''
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='sofset',
+        description='Generate SOFiSTiK settlement load cases for one or '
+                    'more model folders.')
+    parser.add_argument('models', nargs='+',
+                        help='model folders, or glob patterns matching them')
+    parser.add_argument('--input', default=DEFAULT_INPUT,
+                        help='input workbook relative to each model folder '
+                             '(default: %(default)s)')
+    parser.add_argument('--sheet-name', default='known_settlement_values',
+                        help='sheet with known settlements '
+                             '(default: %(default)s)')
+    parser.add_argument('--skiprows', type=int, default=10,
+                        help='rows above the known settlements '
+                             '(default: %(default)s)')
+    parser.add_argument('--nodes-filename',
+                        default='nodes_to_be_interpolated.xlsx',
+                        help='node file in each model folder '
+                             '(default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of model folders processed at the '
+                             'same time (default: number of CPU cores)')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='do not plot the interpolated settlements')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='decimals of settlements in the dat files')
+    parser.add_argument('--skip-nan', action='store_true',
+                        help='leave nodes with nan settlement out of the '
+                             'dat files')
+    parser.add_argument('--max-distance', type=float, default=None,
+                        help='largest distance from the known points that '
+                             'IDW and RBF load cases extrapolate to '
+                             '(default: no limit)')
+    parser.add_argument('--neighbors', type=int, default=None,
+                        help='nearest known points used by IDW and RBF load '
+                             'cases (default: 16)')
+    parser.add_argument('--combined', action='store_true',
+                        help='write all load cases of a model to one dat '
+                             'file')
+    parser.add_argument('--full', action='store_true',
+                        help='regenerate all load cases, also those '
+                             'unchanged since the last run')
+    args = parser.parse_args(argv)
+
+    models = model_dirs(args.models)
+    if not models:
+        parser.error('no model folders found')
+
+    options = dict(input=args.input, sheet_name=args.sheet_name,
+                   skiprows=args.skiprows,
+                   nodes_filename=args.nodes_filename,
+                   plot_results=not args.no_plots,
+                   dat_precision=args.precision, skip_nan=args.skip_nan,
+                   max_distance=args.max_distance, neighbors=args.neighbors,
+                   combined_datfile=args.combined, incremental=not args.full)
+
+    jobs = min(args.jobs or os.cpu_count(), len(models))
+    if jobs <= 1:
+        results = [run_model(model, **options) for model in models]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=_import_libraries,
+                                 initargs=(options['plot_results'],)) as pool:
+            futures = [pool.submit(run_model, model, **options)
+                       for model in models]
+            results = [future.result() for future in futures]
+
+    print(batch_summary(results))
+
+    if any(result['error'] for result in results):
+        return 2
+    return 1 if any(result['n_nan'] for result in results) else 0
+
+
+def model_dirs(patterns):
+    '''Return the folders matching `patterns`, without duplicates.'''
+    models = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) \
+            else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if os.path.isdir(path) and path not in models:
+                models.append(path)
+    return models
+
+
+def run_model(model_dir, input=DEFAULT_INPUT,
+              sheet_name='known_settlement_values', skiprows=10, **kwargs):
+    '''
+    Run the analysis for the model in `model_dir` and return a summary.
 
-        # Determine directory for saving the dat-file
-        if dir_target == 'current_dir':
-            # Get current working directory (where module is run from, i.e.
-            # Sofistik dir)
-            dir_target = os.getcwd()
+    The output files are written to `model_dir`, and everything the
+    analysis prints is written to 'sofset_log.txt' there. Errors are
+    caught and returned in the summary, so that one failing model does not
+    stop a batch run.
 
-        # Write interpolated field to .dat file as Teddy code
-        write_datfile(lc, lc_title, node_no,
-                      settlements_interpolated, dir_target)
+    Parameters
+    ----------
+    model_dir : str
+        Model folder with the node file.
+    input : str, optional
+        Input workbook relative to `model_dir`.
+    sheet_name : str, optional
+        Sheet with known settlements in the input workbook.
+    skiprows : int, optional
+        Rows above the known settlements in the sheet.
+    **kwargs
+        Passed on to `run_analysis`.
 
-        # Plot results if was chosen to do so in the function call
-        if plot_results:
-            plot_interpolation((x_nodes, y_nodes), node_no, lc,
-                               master_dict, settlements_interpolated,
-                               png_targetdir=png_targetdir)
+    Returns
+    -------
+    dict
+        Model folder, number of load cases, number of nan values per load
+        case and in total, wall time and the error, if any.
+    '''
+    start = time.perf_counter()
+    result = dict(model=model_dir, n_load_cases=0, nan_load_cases={},
+                  n_nan=0, wall_time=0, error=None)
+    log = io.StringIO()
+    try:
+        with redirect_stdout(log):
+            file_name = os.path.join(model_dir, input)
+            load_case_dict = load_cases(file_name, sheet_name, skiprows)
+            master_dict = read_known_settlements(
+                file_name, skiprows, load_case_dict, sheet_name=sheet_name,
+                compact=True)
+            options = dict(dict(plot_workers=0, report_json=True), **kwargs)
+            report = run_analysis(master_dict, dir_lookup=model_dir,
+                                  dir_target=model_dir,
+                                  png_targetdir=model_dir, **options)
+
+        # Number of nan values of the load cases run, and of those skipped
+        # as unchanged from the manifest
+        n_nan = {record['load_case']: record['n_nan']
+                 for record in report.records
+                 if record['stage'] == 'status_report'}
+        manifest = read_manifest(os.path.join(model_dir,
+                                              'sofset_manifest.json'))
+        for lc in master_dict:
+            if lc not in n_nan:
+                n_nan[lc] = manifest.get(str(lc), {}).get('n_nan') or 0
+
+        result.update(n_load_cases=len(master_dict),
+                      nan_load_cases={lc: n for lc, n in n_nan.items() if n},
+                      n_nan=sum(n_nan.values()))
+    except Exception as error:
+        log.write(traceback.format_exc())
+        result['error'] = f'{type(error).__name__}: {error}'
+    finally:
+        result['wall_time'] = time.perf_counter() - start
+        try:
+            with open(os.path.join(model_dir, 'sofset_log.txt'), 'w') as file:
+                file.write(log.getvalue())
+        except OSError:
+            pass
+
+    return result
+
+
+def batch_summary(results):
+    '''Return a table summarizing the results of `run_model`.'''
+    lines = ['    Model                          Load cases  Nan values  '
+             'Time [s]  Status']
+    for result in results:
+        if result['error']:
+            status = f'FAILED: {result["error"]}'
+        elif result['n_nan']:
+            status = 'nan in LC ' + ', '.join(
+                str(lc) for lc in result['nan_load_cases'])
+        else:
+            status = 'ok'
+        name = os.path.basename(result['model']) or result['model']
+        lines.append(f'    {name:<30} {result["n_load_cases"]:>10} '
+                     f'{result["n_nan"]:>11} {result["wall_time"]:>9.1f}  '
+                     f'{status}')
+    return '\n'.join(lines)
+
+
+def _import_libraries(plot_results):
+    '''Import the libraries used by the analysis in a worker process.'''
+    modules = ['scipy.interpolate', 'scipy.spatial', 'pandas', 'openpyxl']
+    if plot_results:
+        modules += ['matplotlib.backends.backend_agg', 'matplotlib.figure']
+    for module in modules:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
 
 
 if __name__ == "__main__":
 
+    # Arguments are model folders to process from the command line, see
+    # `main`. Without arguments, the script runs the model it is called
+    # from in Teddy.
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
     # Set path to Excel file for the input settlement field
     file_name = 'Settlement_interpolation\\known_settlement_values.xlsm'
 
@@ -580,7 +3991,8 @@ if __name__ == "__main__":
     # Create master dictionary with load cases
     d = read_known_settlements(file_name, skiprows, load_case_dict,
                                points_per_section=5,
-                               sheet_name='known_settlement_values')
+                               sheet_name='known_settlement_values',
+                               compact=True)
 
     # Interpolate settlements and create dat-files
     run_analysis(d, plot_results=True)
@@ -0,0 +1,197 @@
+'''Accuracy and speed of the interpolation methods on analytic fields.
+
+The known settlements are sampled from a Peck-type settlement trough on the
+section layout of the input sheet (sections along the alignment with five
+points across), and interpolated to random nodes inside the known area. The
+interpolated values are compared with the analytic trough, and the error,
+runtime and peak memory of every 1D and 2D method are collected in one
+table. The errors are checked against fixed limits, so a change that makes
+a method less accurate fails the tests.
+
+By default only 10k nodes are run. Set the environment variable
+SOFSET_BENCH_FULL=1 to also run 100k and 1M nodes. The table is printed by
+`test_accuracy_table` (use `pytest -s` to see it), and written as JSON to
+the path in SOFSET_ACCURACY_JSON if that is set, e.g.
+
+    SOFSET_BENCH_FULL=1 SOFSET_ACCURACY_JSON=accuracy.json
+        python -m pytest tests/test_accuracy.py -s
+'''
+
+# Standard library imports
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Third party imports
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+# Insert path to module to test in sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sofset'))
+
+# Import main project module
+import sofset   # noqa
+
+
+if os.environ.get('SOFSET_BENCH_FULL'):
+    NODE_COUNTS = [10_000, 100_000, 1_000_000]
+else:
+    NODE_COUNTS = [10_000]
+
+METHODS = {'1d': ['linear', 'cubic', 'nearest'],
+           '2d': ['linear', 'cubic', 'nearest', 'idw', 'rbf']}
+
+# Layout of the known points and the analytic trough
+SECTIONS = 40
+CHAINAGE_START, CHAINAGE_END = 6800, 7800
+Y_KNOWN = np.array([-15, -7.5, 0, 7.5, 15])
+DEPTH, CENTRE, WIDTH_ALONG, WIDTH_ACROSS = 50.0, 7250.0, 150.0, 10.0
+
+# Largest allowed error relative to the trough depth, as (max, rms), about
+# 1.5 times the errors of the current methods
+TOLERANCE = {('1d', 'linear'): (5.5e-3, 1.8e-3),
+             ('1d', 'cubic'): (1.5e-5, 4e-6),
+             ('1d', 'nearest'): (8e-2, 2.7e-2),
+             ('2d', 'linear'): (9e-2, 2.3e-2),
+             ('2d', 'cubic'): (3e-2, 7e-3),
+             ('2d', 'nearest'): (3.5e-1, 8e-2),
+             ('2d', 'idw'): (4.2e-1, 1.1e-1),
+             ('2d', 'rbf'): (1.8e-1, 3.5e-2)}
+
+
+def trough(x, y=None):
+    '''Return the analytic settlement trough, constant across if `y` is None.'''
+    along = np.exp(-(x - CENTRE)**2 / (2 * WIDTH_ALONG**2))
+    if y is None:
+        return -DEPTH * along
+    return -DEPTH * along * np.exp(-np.asarray(y)**2 / (2 * WIDTH_ACROSS**2))
+
+
+def known_points(dim):
+    '''Return the known coordinates and settlements of the trough.'''
+    x_sections = np.linspace(CHAINAGE_START, CHAINAGE_END, SECTIONS)
+    if dim == '1d':
+        return x_sections, None, trough(x_sections)
+    x_known = np.repeat(x_sections, len(Y_KNOWN))
+    y_known = np.tile(Y_KNOWN, SECTIONS)
+    return x_known, y_known, trough(x_known, y_known)
+
+
+def nodes(n_nodes, seed=0):
+    '''Return random node coordinates inside the area of the known points.'''
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(CHAINAGE_START, CHAINAGE_END, n_nodes),
+            rng.uniform(Y_KNOWN[0], Y_KNOWN[-1], n_nodes))
+
+
+def interpolate(dim, method, x, y, dtype=np.float64):
+    '''Return the interpolated trough in the nodes (x, y).'''
+    x_known, y_known, z_known = known_points(dim)
+    if dim == '1d':
+        interpolator = sofset.Interpolator1D(x_known, method=method,
+                                             dtype=dtype)
+    else:
+        interpolator = sofset.Interpolator2D(x_known, y_known, method=method,
+                                             dtype=dtype)
+    interpolator.set_nodes(x, y)
+    return interpolator(z_known)
+
+
+def evaluate(dim, method, n_nodes):
+    '''Return error, runtime and peak memory of one method and size.'''
+    x, y = nodes(n_nodes)
+    exact = trough(x, None if dim == '1d' else y)
+
+    start = time.perf_counter()
+    result = interpolate(dim, method, x, y)
+    wall_time = time.perf_counter() - start
+
+    # Memory is measured in a separate run, as tracing slows it down
+    tracemalloc.start()
+    try:
+        interpolate(dim, method, x, y)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    error = np.abs(result - exact) / DEPTH
+    return dict(dim=dim, method=method, n_nodes=n_nodes,
+                max_error=float(np.nanmax(error)),
+                rms_error=float(np.sqrt(np.nanmean(error**2))),
+                n_nan=int(np.isnan(result).sum()), wall_time=wall_time,
+                peak_mb=peak / 2**20)
+
+
+@pytest.fixture(scope='module')
+def results():
+    '''Return the evaluation of every method and node count.'''
+    return [evaluate(dim, method, n_nodes)
+            for n_nodes in NODE_COUNTS
+            for dim, methods in METHODS.items()
+            for method in methods]
+
+
+def format_table(results):
+    '''Return the results as a speed-vs-accuracy table.'''
+    lines = ['    Dim  Method      Nodes  Max error  RMS error   Nan  '
+             'Time [s]  Peak [MB]']
+    for r in results:
+        lines.append(f'    {r["dim"]:<4} {r["method"]:<8} {r["n_nodes"]:>8} '
+                     f'{r["max_error"]:>10.2e} {r["rms_error"]:>10.2e} '
+                     f'{r["n_nan"]:>5} {r["wall_time"]:>9.3f} '
+                     f'{r["peak_mb"]:>10.1f}')
+    return '\n'.join(lines)
+
+
+def test_accuracy_table(results):
+    print(f'''
+    Interpolation of a settlement trough of depth {DEPTH:g}, errors relative
+    to the depth
+{format_table(results)}''')
+
+    path = os.environ.get('SOFSET_ACCURACY_JSON')
+    if path:
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+@pytest.mark.parametrize('dim, method', list(TOLERANCE))
+def test_accuracy(results, dim, method):
+    max_error, rms_error = TOLERANCE[dim, method]
+    for r in results:
+        if (r['dim'], r['method']) == (dim, method):
+            assert r['n_nan'] == 0
+            assert r['max_error'] < max_error
+            assert r['rms_error'] < rms_error
+
+
+@pytest.mark.parametrize('dim, method', list(TOLERANCE))
+def test_float32_accuracy(dim, method):
+    x, y = nodes(NODE_COUNTS[0])
+    result = interpolate(dim, method, x, y, dtype=np.float32)
+    assert result.dtype == np.float32
+
+    exact = trough(x, None if dim == '1d' else y)
+    max_error, rms_error = TOLERANCE[dim, method]
+    error = np.abs(result - exact) / DEPTH
+    assert np.nanmax(error) < max(max_error, 1e-4)
+    assert np.sqrt(np.nanmean(error**2)) < max(rms_error, 1e-4)
+
+
+def test_pipeline_uses_method():
+    x_known, y_known, z_known = known_points('2d')
+    x, y = nodes(1000)
+    settlements = {}
+    for method in METHODS['2d']:
+        settlements[method] = sofset.interpolate_settlements2D(
+            x_known, y_known, z_known, x, y, method=method)
+        np.testing.assert_allclose(settlements[method],
+                                   interpolate('2d', method, x, y))
+
+    # Each method gives its own settlement field
+    for a, b in zip(METHODS['2d'], METHODS['2d'][1:]):
+        assert not np.allclose(settlements[a], settlements[b])
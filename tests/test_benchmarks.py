@@ -0,0 +1,256 @@
+'''Benchmarks for the stages of the settlement interpolation pipeline.
+
+The benchmarks use pytest-benchmark on synthetic node tables and settlement
+fields. By default only the smallest model sizes are run, so the benchmarks
+stay quick as part of the normal test suite. Set the environment variable
+SOFSET_BENCH_FULL=1 to run 10k, 100k and 1M nodes with 1, 10 and 50 load
+cases, and write the results to a machine-readable file with e.g.
+
+    SOFSET_BENCH_FULL=1 python -m pytest tests/test_benchmarks.py
+        --benchmark-only --benchmark-json=benchmark.json
+'''
+
+# Standard library imports
+import sys
+import os
+
+# Third party imports
+import numpy as np
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('scipy')
+openpyxl = pytest.importorskip('openpyxl')
+
+# Insert path to module to test in sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'sofset'))
+
+# Import main project module
+import sofset   # noqa
+
+
+if os.environ.get('SOFSET_BENCH_FULL'):
+    NODE_COUNTS = [10_000, 100_000, 1_000_000]
+    LOAD_CASE_COUNTS = [1, 10, 50]
+else:
+    NODE_COUNTS = [10_000]
+    LOAD_CASE_COUNTS = [1, 10]
+
+# Layout of the synthetic model
+SECTIONS = 40
+CHAINAGE_START, CHAINAGE_END = 6800, 7800
+Y_KNOWN = [-15, -7.5, 0, 7.5, 15]
+SHEET_NAME = 'known_settlement_values'
+SKIPROWS = 10
+
+
+def peck_trough(x, y, depth, centre):
+    '''Return a Peck-type settlement trough along and across the alignment.'''
+    along = np.exp(-(x - centre)**2 / (2 * 150**2))
+    across = np.exp(-np.asarray(y)**2 / (2 * 10**2))
+    return -depth * along * across
+
+
+def write_known_workbook(path, n_lc):
+    '''Write an input workbook in the layout of known_settlement_values.xlsm.
+
+    Every other load case is 2D cubic, the rest are 1D cubic.
+    '''
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = SHEET_NAME
+
+    x = np.linspace(CHAINAGE_START, CHAINAGE_END, SECTIONS)
+    for i in range(n_lc):
+        col = 8 + 5 * i
+        dim = '2D (X,Y)-variation' if i % 2 == 0 else '1D (X)-variation'
+        ws.cell(SKIPROWS - 1, col, 100 + i)
+        ws.cell(SKIPROWS, col, f'Synthetic trough {i}')
+        ws.cell(SKIPROWS + 1, col, f'{dim} - Cubic')
+
+    for row, x_section in enumerate(x, start=SKIPROWS + 2):
+        ws.cell(row, 2, float(x_section))
+        for j, y in enumerate(Y_KNOWN):
+            ws.cell(row, 3 + j, y)
+        for i in range(n_lc):
+            z = peck_trough(x_section, Y_KNOWN, 10 + i, 7000 + 10 * i)
+            for j, value in enumerate(z):
+                ws.cell(row, 8 + 5 * i + j, float(value))
+
+    wb.save(path)
+
+
+def node_arrays(n_nodes, seed=0):
+    '''Return random node coordinates and numbers along the alignment.'''
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(CHAINAGE_START, CHAINAGE_END, n_nodes)
+    y = rng.uniform(-15, 15, n_nodes)
+    z = rng.uniform(-10, 0, n_nodes)
+    return x, y, z, np.arange(1, n_nodes + 1)
+
+
+@pytest.fixture(scope='session')
+def known_workbooks(tmp_path_factory):
+    '''Return paths of synthetic input workbooks keyed by load case count.'''
+    dir_data = tmp_path_factory.mktemp('known')
+    paths = {}
+    for n_lc in LOAD_CASE_COUNTS:
+        paths[n_lc] = str(dir_data / f'known_{n_lc}.xlsx')
+        write_known_workbook(paths[n_lc], n_lc)
+    return paths
+
+
+@pytest.fixture(scope='session')
+def node_files(tmp_path_factory):
+    '''Return folders with synthetic node exports keyed by node count.'''
+    dirs = {}
+    for n_nodes in NODE_COUNTS:
+        dirs[n_nodes] = tmp_path_factory.mktemp(f'nodes_{n_nodes}')
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet('XLSX-Export')
+        ws.append(['NR', 'X [m]', 'Y [m]', 'Z [m]'])
+        x, y, z, node_no = node_arrays(n_nodes)
+        for row in zip(node_no.tolist(), x.tolist(), y.tolist(), z.tolist()):
+            ws.append(row)
+        wb.save(dirs[n_nodes] / 'nodes_to_be_interpolated.xlsx')
+    return dirs
+
+
+def master_dict(path):
+    '''Return the load case dictionary of a synthetic input workbook.'''
+    load_case_dict = sofset.load_cases(path, SHEET_NAME, SKIPROWS)
+    return sofset.read_known_settlements(path, SKIPROWS, load_case_dict,
+                                         sheet_name=SHEET_NAME)
+
+
+def run(benchmark, func, setup=None, rounds=3, **extra_info):
+    '''Benchmark `func` for a fixed number of rounds and record metadata.'''
+    benchmark.extra_info.update(extra_info)
+    return benchmark.pedantic(func, setup=setup, rounds=rounds, iterations=1)
+
+
+@pytest.mark.parametrize('n_lc', LOAD_CASE_COUNTS)
+def test_load_cases(benchmark, known_workbooks, n_lc):
+    path = known_workbooks[n_lc]
+    d = run(benchmark, lambda: sofset.load_cases(path, SHEET_NAME, SKIPROWS),
+            setup=sofset._sheet_cache.clear, stage='load_cases', n_lc=n_lc)
+    assert len(d) == n_lc
+
+
+@pytest.mark.parametrize('n_lc', LOAD_CASE_COUNTS)
+def test_read_known_settlements(benchmark, known_workbooks, n_lc):
+    path = known_workbooks[n_lc]
+    load_case_dict = sofset.load_cases(path, SHEET_NAME, SKIPROWS)
+    d = run(benchmark,
+            lambda: sofset.read_known_settlements(
+                path, SKIPROWS, load_case_dict, sheet_name=SHEET_NAME),
+            setup=sofset._sheet_cache.clear,
+            stage='read_known_settlements', n_lc=n_lc)
+    assert all('Z' in data for data in d.values())
+
+
+@pytest.mark.parametrize('n_nodes', NODE_COUNTS)
+def test_read_excel_nodes(benchmark, node_files, n_nodes):
+    nodes = run(benchmark,
+                lambda: sofset.read_excel_nodes(dir_lookup=str(node_files[n_nodes])),
+                rounds=1, stage='read_excel_nodes', n_nodes=n_nodes)
+    assert len(nodes[0]) == n_nodes
+
+
+@pytest.mark.parametrize('n_nodes', NODE_COUNTS)
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'npz'])
+def test_read_nodes(benchmark, tmp_path, fmt, n_nodes):
+    x, y, z, node_no = node_arrays(n_nodes)
+    table = np.column_stack((node_no, x, y, z))
+    filename = f'nodes.{fmt}'
+    if fmt == 'csv':
+        np.savetxt(tmp_path / filename, table, delimiter=',', comments='',
+                   header='NR,X [m],Y [m],Z [m]', fmt=['%d', '%r', '%r', '%r'])
+    elif fmt == 'npy':
+        np.save(tmp_path / filename, table)
+    else:
+        np.savez(tmp_path / filename, x=x, y=y, z=z, node_no=node_no)
+
+    nodes = run(benchmark,
+                lambda: sofset.read_nodes(dir_lookup=str(tmp_path),
+                                          filename=filename),
+                stage=f'read_nodes_{fmt}', n_nodes=n_nodes)
+    np.testing.assert_array_equal(nodes[3], node_no)
+
+
+@pytest.mark.parametrize('n_nodes', NODE_COUNTS)
+def test_load_nodes_sidecar(benchmark, node_files, n_nodes):
+    dir_lookup = str(node_files[n_nodes])
+    sofset.load_nodes(dir_lookup=dir_lookup)
+    nodes = run(benchmark, lambda: sofset.load_nodes(dir_lookup=dir_lookup),
+                setup=sofset.clear_node_cache, stage='load_nodes_sidecar',
+                n_nodes=n_nodes)
+    assert len(nodes[0]) == n_nodes
+
+
+@pytest.mark.parametrize('n_lc', LOAD_CASE_COUNTS)
+@pytest.mark.parametrize('n_nodes', NODE_COUNTS)
+@pytest.mark.parametrize('dim', ['1d', '2d'])
+@pytest.mark.parametrize('method', ['linear', 'cubic'])
+def test_interpolation(benchmark, dim, method, n_nodes, n_lc):
+    x_sections = np.linspace(CHAINAGE_START, CHAINAGE_END, SECTIONS)
+    if dim == '1d':
+        x_known, y_known = x_sections, None
+    else:
+        x_known = np.repeat(x_sections, len(Y_KNOWN))
+        y_known = np.tile(Y_KNOWN, SECTIONS)
+    z_stacked = np.vstack([
+        peck_trough(x_known, 0 if y_known is None else y_known, 10 + i,
+                    7000 + 10 * i) for i in range(n_lc)])
+    x, y, _, _ = node_arrays(n_nodes)
+
+    def setup():
+        # New interpolator for each round, as it skips locating the same
+        # nodes again
+        if dim == '1d':
+            return (sofset.Interpolator1D(x_known, method=method),), {}
+        return (sofset.Interpolator2D(x_known, y_known, method=method),), {}
+
+    def interpolate(interpolator):
+        interpolator.set_nodes(x, y)
+        return interpolator(z_stacked)
+
+    result = run(benchmark, interpolate, setup=setup,
+                 stage=f'interpolation_{dim}', method=method, n_nodes=n_nodes,
+                 n_lc=n_lc)
+    assert result.shape == (n_lc, n_nodes)
+
+
+@pytest.mark.parametrize('n_lc', LOAD_CASE_COUNTS)
+@pytest.mark.parametrize('n_nodes', NODE_COUNTS)
+def test_write_datfile(benchmark, tmp_path, n_nodes, n_lc):
+    x, _, _, node_no = node_arrays(n_nodes)
+    settlements = peck_trough(x, 0, 10, 7000)
+
+    def write():
+        for lc in range(n_lc):
+            sofset.write_datfile(lc, 'Benchmark', node_no, settlements,
+                                 dir_target=str(tmp_path))
+
+    run(benchmark, write, rounds=1, stage='write_datfile', n_nodes=n_nodes,
+        n_lc=n_lc)
+    assert len(os.listdir(tmp_path)) == n_lc
+
+
+@pytest.mark.parametrize('n_lc', LOAD_CASE_COUNTS)
+@pytest.mark.parametrize('n_nodes', NODE_COUNTS)
+def test_plotting(benchmark, tmp_path, known_workbooks, n_nodes, n_lc):
+    pytest.importorskip('matplotlib')
+    d = master_dict(known_workbooks[n_lc])
+    x, y, _, node_no = node_arrays(n_nodes)
+    results = sofset.interpolate_load_cases(d, x, y)
+
+    def plot():
+        with sofset.SettlementPlotter(workers=0) as plotter:
+            for lc in d:
+                plotter.plot((x, y), node_no, lc, d, results[lc],
+                             png_targetdir=str(tmp_path))
+
+    run(benchmark, plot, rounds=1, stage='plotting', n_nodes=n_nodes,
+        n_lc=n_lc)
+    assert len(os.listdir(tmp_path)) == n_lc
@@ -1,10 +1,15 @@
 
 # Standard library imports
+import gzip
+import json
+import subprocess
 import sys
 import os
 
 # Third party imports
-# import pytest
+import numpy as np
+import pytest
+from scipy.interpolate import griddata
 
 # Insert path to module to test in sys.path
 sys.path.insert(0, os.path.abspath('./sofset'))
@@ -12,6 +17,946 @@ sys.path.insert(0, os.path.abspath('./sofset'))
 # Import main project module
 import sofset   # noqa
 
+# Input workbook shipped with the tests
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata',
+                        'known_settlement_values.xlsm')
+
+
+def known_field(n_lc=3, seed=0):
+    '''Return random known points and stacked settlement fields.'''
+    rng = np.random.default_rng(seed)
+    x_known = 6800 + 500 * rng.random(40)
+    y_known = -30 + 60 * rng.random(40)
+    z_known = -100 * rng.random((n_lc, 40))
+    return x_known, y_known, z_known
+
+
+def node_field(n=2000, seed=1):
+    '''Return random node coordinates around the known points.'''
+    rng = np.random.default_rng(seed)
+    return 6780 + 540 * rng.random(n), -35 + 70 * rng.random(n)
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic', 'nearest'])
+def test_interpolator2D_matches_griddata(method):
+    x_known, y_known, z_known = known_field()
+    x, y = node_field()
+
+    interpolator = sofset.Interpolator2D(x_known, y_known, method=method)
+    interpolator.set_nodes(x, y)
+    batched = interpolator(z_known)
+
+    assert batched.shape == (len(z_known), len(x))
+    for z, result in zip(z_known, batched):
+        expected = griddata(np.column_stack((x_known, y_known)), z, (x, y),
+                            method=method)
+        np.testing.assert_allclose(result, expected, equal_nan=True)
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic', 'nearest'])
+def test_interpolator2D_matches_griddata_on_workbook(method):
+    # The sections of the input sheet form a regular grid, where the
+    # Delaunay triangulation depends on how qhull breaks ties
+    load_case_dict = sofset.load_cases(TESTDATA, 'known_settlement_values', 10)
+    d = sofset.read_known_settlements(TESTDATA, 10, load_case_dict)
+    x_known, y_known, z_known = d[125]['X'], d[125]['Y'], d[125]['Z']
+    rng = np.random.default_rng(3)
+    x = np.concatenate((rng.uniform(x_known.min(), x_known.max(), 5000),
+                        x_known))
+    y = np.concatenate((rng.uniform(y_known.min(), y_known.max(), 5000),
+                        y_known))
+
+    interpolator = sofset.Interpolator2D(x_known, y_known, method=method)
+    interpolator.set_nodes(x, y)
+    expected = griddata(np.column_stack((x_known, y_known)), z_known, (x, y),
+                        method=method)
+    np.testing.assert_allclose(interpolator(z_known), expected, atol=1e-9,
+                               equal_nan=True)
+
+
+def test_interpolator2D_local_methods():
+    from scipy.interpolate import RBFInterpolator
+    x_known, y_known, z_known = known_field()
+    x, y = node_field()
+    points = np.column_stack((x_known, y_known))
+    xi = np.column_stack((x, y))
+
+    # Inverse distance weighting of the 5 nearest points
+    idw = sofset.Interpolator2D(x_known, y_known, method='idw', neighbors=5)
+    idw.set_nodes(x, y)
+    dist = np.linalg.norm(xi[:, None] - points[None], axis=2)
+    nearest = np.argsort(dist, axis=1)[:, :5]
+    weights = 1 / np.take_along_axis(dist, nearest, axis=1)**2
+    expected = (z_known[:, nearest] * weights).sum(axis=2) / weights.sum(axis=1)
+    np.testing.assert_allclose(idw(z_known), expected)
+
+    # Known points are reproduced exactly
+    idw.set_nodes(x_known, y_known)
+    np.testing.assert_allclose(idw(z_known), z_known)
+
+    # Local thin plate splines, extrapolating up to max_distance
+    rbf = sofset.Interpolator2D(x_known, y_known, method='rbf', neighbors=20,
+                                max_distance=10)
+    rbf.set_nodes(x, y)
+    result = rbf(z_known)
+    outside = dist.min(axis=1) > 10
+    assert outside.any() and np.isnan(result[:, outside]).all()
+    expected = RBFInterpolator(points, z_known.T, neighbors=20)(xi[~outside]).T
+    np.testing.assert_allclose(result[:, ~outside], expected)
+
+    assert sofset.interpolation_method('2D (X,Y)-variation - IDW') == 'idw'
+    assert sofset.interpolation_method('2D (X,Y)-variation - RBF') == 'rbf'
+
+
+def test_idw_options_in_pipeline(tmp_path, capsys):
+    options = sofset.interpolation_options
+    assert options('2D (X,Y)-variation - IDW neighbors=8 max_distance=2.5',
+                   max_distance=10) == dict(max_distance=2.5, neighbors=8)
+    assert options('2D (X,Y)-variation - RBF', max_distance=10) == dict(
+        max_distance=10)
+    assert options('2D (X,Y)-variation - Linear', max_distance=10) == {}
+    assert options('1D (X)-variation - Linear', neighbors=8) == {}
+
+    # LC2 sets its own limit, LC1 takes the one of the run
+    master_dict = write_model(tmp_path, [1, 2], ['2D (X,Y)-variation - IDW',
+                                                 '2D (X,Y)-variation - IDW '
+                                                 'max_distance=20'])
+    x, y, _, node_no = sofset.load_nodes(dir_lookup=str(tmp_path))
+    x_known, y_known = master_dict[1]['X'], master_dict[1]['Y']
+    dist = np.hypot(x[:, None] - x_known, y[:, None] - y_known).min(axis=1)
+
+    for chunk_size in [None, 100]:
+        dir_target = tmp_path / f'chunk{chunk_size}'
+        dir_target.mkdir()
+        sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                            dir_target=str(dir_target), plot_results=False,
+                            report_json=False, chunk_size=chunk_size,
+                            max_distance=10)
+        for lc, max_distance in [(1, 10), (2, 20)]:
+            lines = (dir_target / f'settlement_LC{lc}.dat').read_text()
+            nan_nodes = [int(line.split()[2]) for line in lines.splitlines()
+                         if line.endswith(' nan ')]
+            assert 0 < len(nan_nodes) < len(x)
+            assert set(nan_nodes) == set(node_no[dist > max_distance])
+    capsys.readouterr()
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic', 'nearest'])
+def test_interpolator1D_matches_interp1d(method):
+    from scipy.interpolate import interp1d
+    x_known, _, z_known = known_field()
+    x_known, z_known = x_known[:12], z_known[:, :12]
+    x = np.concatenate((node_field()[0], x_known, [x_known.max() + 1]))
+
+    interpolator = sofset.Interpolator1D(x_known, method=method)
+    interpolator.set_nodes(x)
+    batched = interpolator(z_known)
+
+    assert batched.shape == (len(z_known), len(x))
+    for z, result in zip(z_known, batched):
+        expected = interp1d(x_known, z, kind=method, bounds_error=False)(x)
+        np.testing.assert_allclose(result, expected, equal_nan=True,
+                                   atol=1e-9)
+
+
+def test_interpolate_load_cases_groups_shared_points():
+    x_known, y_known, _ = known_field()
+    x, y = node_field()
+    master_dict = known_load_cases([101, 102, 103, 104],
+                                   ['2D (X,Y)-variation - Linear',
+                                    '1D (X)-variation - Cubic'] * 2)
+
+    groups = sofset.group_load_cases(master_dict)
+    results = sofset.interpolate_load_cases(master_dict, x, y)
+
+    assert [lcs for _, lcs, _ in groups] == [[101, 103], [102, 104]]
+    assert list(results) == [101, 102, 103, 104]
+    for lc in [101, 103]:
+        expected = sofset.interpolate_settlements2D(
+            x_known, y_known, master_dict[lc]['Z'], x, y, method='linear')
+        np.testing.assert_allclose(results[lc], expected, equal_nan=True)
+
+
+def test_interpolator_cache():
+    x_known, y_known, z_known = known_field()
+    x, y = node_field()
+    cache = sofset.InterpolatorCache(maxsize=2)
+
+    linear = cache.get(x_known, y_known, method='linear')
+    assert cache.get(x_known.copy(), y_known, method='linear') is linear
+    assert cache.get(x_known, y_known, method='cubic') is not linear
+    assert isinstance(cache.get(x_known, method='linear'),
+                      sofset.Interpolator1D)
+    assert cache.info() == dict(hits=1, misses=3, maxsize=2, currsize=2)
+
+    # The least recently used interpolator was dropped
+    assert cache.get(x_known, y_known, method='linear') is not linear
+
+    # New nodes and new settlement fields on the cached interpolator
+    linear = cache.get(x_known, y_known, method='linear')
+    for nodes in [(x, y), (x[:100], y[:100]), (x, y)]:
+        linear.set_nodes(*nodes)
+        np.testing.assert_allclose(
+            linear(z_known[1]),
+            griddata(np.column_stack((x_known, y_known)), z_known[1], nodes,
+                     method='linear'), equal_nan=True)
+
+    # Dropping the located nodes keeps the triangulation
+    tri = linear.tri
+    cache.clear_nodes()
+    assert linear.xi is None and linear.tri is tri
+    with pytest.raises(ValueError):
+        linear(z_known[1])
+
+    cache.resize(1)
+    assert len(cache) == 1
+    cache.clear()
+    assert cache.info() == dict(hits=0, misses=0, maxsize=1, currsize=0)
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic', 'nearest', 'idw',
+                                    'rbf', '1d_linear', '1d_cubic'])
+def test_interpolator_dtype_and_out(method, monkeypatch):
+    # Known points and nodes at a chainage of 120 km, where float32 only
+    # resolves about 8 mm without recentring
+    x_known, y_known, z_known = known_field()
+    x, y = node_field()
+    x_known, x = x_known + 113200, x + 113200
+    monkeypatch.setattr(sofset, '_block_size', 300)
+
+    def interpolate(dtype, out=None):
+        if method.startswith('1d'):
+            interpolator = sofset.Interpolator1D(x_known, method=method[3:],
+                                                 dtype=dtype)
+        else:
+            interpolator = sofset.Interpolator2D(x_known, y_known,
+                                                 method=method, dtype=dtype)
+        interpolator.set_nodes(x, y)
+        return interpolator(z_known, out=out)
+
+    expected = interpolate(np.float64)
+    result = interpolate(np.float32)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, expected, atol=1e-3, equal_nan=True)
+
+    # Results are written into a preallocated buffer
+    buffer = np.zeros((5, len(x)))
+    assert interpolate(np.float64, out=buffer[1:4]) is not None
+    np.testing.assert_array_equal(buffer[1:4], expected)
+    assert not buffer[[0, 4]].any()
+    with pytest.raises(ValueError):
+        interpolate(np.float64, out=buffer)
+
+
+def write_node_file(dir_path, n=50, seed=2):
+    '''Write a SOFiSTiK-style node export and return its dataframe.'''
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('openpyxl')
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'NR': np.arange(1, n + 1),
+                       'X [m]': 6800 + 500 * rng.random(n),
+                       'Y [m]': -30 + 60 * rng.random(n),
+                       'Z [m]': rng.random(n)})
+    df.to_excel(os.path.join(dir_path, 'nodes_to_be_interpolated.xlsx'),
+                sheet_name='XLSX-Export', index=False)
+    return df
+
+
+def known_load_cases(lcs, int_method='2D (X,Y)-variation - Linear'):
+    '''Return a master dictionary of load cases on the random known points.
+
+    `int_method` is used for all load cases, or is a list with the method of
+    each load case.
+    '''
+    x_known, y_known, z_known = known_field(n_lc=len(lcs))
+    if isinstance(int_method, str):
+        int_method = [int_method] * len(lcs)
+    return {lc: {'title': f'LC {lc}', 'int_method': method,
+                 'X': x_known, 'Y': y_known, 'Z': z}
+            for lc, z, method in zip(lcs, z_known, int_method)}
+
+
+def write_model(dir_path, lcs, int_method='2D (X,Y)-variation - Linear',
+                n=300):
+    '''Write a node export of `n` nodes and return the master dictionary.'''
+    write_node_file(dir_path, n=n)
+    return known_load_cases(lcs, int_method)
+
+
+def test_load_nodes_reads_excel_once(tmp_path, monkeypatch):
+    df = write_node_file(tmp_path)
+    calls = []
+    read_excel_nodes = sofset.read_excel_nodes
+    monkeypatch.setattr(sofset, 'read_excel_nodes',
+                        lambda **kw: calls.append(kw) or read_excel_nodes(**kw))
+    sofset.clear_node_cache()
+
+    x, y, z, node_no = sofset.load_nodes(dir_lookup=str(tmp_path))
+    sofset.load_nodes(dir_lookup=str(tmp_path))
+    np.testing.assert_allclose(x, df['X [m]'])
+    np.testing.assert_array_equal(node_no, df['NR'])
+    assert len(calls) == 1
+
+    # A new session reuses the binary sidecar instead of the Excel file
+    sofset.clear_node_cache()
+    x_sidecar = sofset.load_nodes(dir_lookup=str(tmp_path))[0]
+    np.testing.assert_array_equal(x_sidecar, x)
+    assert len(calls) == 1
+
+    # Changing the Excel file invalidates both caches
+    write_node_file(tmp_path, n=60)
+    assert len(sofset.load_nodes(dir_lookup=str(tmp_path))[0]) == 60
+    assert len(calls) == 2
+
+
+def test_read_input_workbook_parses_sheet_once(monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    calls = []
+    load_workbook = openpyxl.load_workbook
+    monkeypatch.setattr(openpyxl, 'load_workbook',
+                        lambda *a, **kw: calls.append(a) or load_workbook(*a, **kw))
+    sofset._sheet_cache.clear()
+
+    load_case_dict = sofset.load_cases(TESTDATA, 'known_settlement_values', 10)
+    d = sofset.read_known_settlements(TESTDATA, 10, load_case_dict)
+
+    assert len(calls) == 1
+    assert list(d) == [125, 124, 126, 127]
+    assert d[125]['int_method'] == '2D (X,Y)-variation - Cubic'
+    assert d[125]['X'].shape == d[125]['Y'].shape == d[125]['Z'].shape == (27,)
+    np.testing.assert_array_equal(
+        d[124]['Z'], [-117, -117, -117, -90, -92, -43, -12, -12, -12])
+    np.testing.assert_array_equal(d[124]['X'][[0, -1]], [6800, 7300])
+
+
+def test_read_nodes_formats(tmp_path):
+    df = write_node_file(tmp_path)
+    expected = sofset.read_excel_nodes(dir_lookup=str(tmp_path))
+
+    df.to_csv(tmp_path / 'nodes.csv', index=False)
+    table = df[['NR', 'X [m]', 'Y [m]', 'Z [m]']].to_numpy()
+    np.save(tmp_path / 'nodes.npy', table)
+    np.save(tmp_path / 'nodes_structured.npy', df.to_records(index=False))
+    np.savez(tmp_path / 'nodes.npz', x=expected[0], y=expected[1],
+             z=expected[2], node_no=expected[3])
+    names = ['nodes.csv', 'nodes.npy', 'nodes_structured.npy', 'nodes.npz']
+
+    for name in names:
+        nodes = sofset.read_nodes(dir_lookup=str(tmp_path), filename=name)
+        for arr, arr_expected in zip(nodes, expected):
+            np.testing.assert_allclose(arr, arr_expected)
+        assert nodes[3].dtype == np.int64
+
+        chunks = list(sofset.iter_nodes(dir_lookup=str(tmp_path),
+                                        filename=name, chunk_size=20))
+        assert [len(chunk[3]) for chunk in chunks] == [20, 20, 10]
+        np.testing.assert_array_equal(
+            np.concatenate([chunk[3] for chunk in chunks]), expected[3])
+
+    with pytest.raises(ValueError):
+        sofset.read_nodes(dir_lookup=str(tmp_path), filename='nodes.txt')
+
+
+def test_read_known_settlements_from_csv(tmp_path):
+    import csv
+    values = sofset.read_sheet(TESTDATA, 'known_settlement_values')
+    with open(tmp_path / 'known.csv', 'w', newline='') as file:
+        csv.writer(file).writerows(
+            ['' if value is None else value for value in row]
+            for row in values)
+
+    dicts = []
+    for file_name in [TESTDATA, str(tmp_path / 'known.csv')]:
+        load_case_dict = sofset.load_cases(file_name,
+                                           'known_settlement_values', 10)
+        dicts.append(sofset.read_known_settlements(file_name, 10,
+                                                   load_case_dict))
+
+    assert list(dicts[0]) == list(dicts[1]) == [125, 124, 126, 127]
+    for lc in dicts[0]:
+        for key in ['title', 'int_method']:
+            assert dicts[0][lc][key] == dicts[1][lc][key]
+        for key in ['X', 'Y', 'Z']:
+            np.testing.assert_array_equal(dicts[0][lc][key], dicts[1][lc][key])
+
+
+def test_load_case_set_matches_dict(tmp_path, capsys):
+    import pickle
+    load_case_dict = sofset.load_cases(TESTDATA, 'known_settlement_values', 10)
+    d = sofset.read_known_settlements(TESTDATA, 10, load_case_dict)
+    compact = sofset.read_known_settlements(
+        TESTDATA, 10, sofset.load_cases(TESTDATA, 'known_settlement_values',
+                                        10), compact=True)
+
+    assert isinstance(compact, sofset.LoadCaseSet)
+    assert list(compact) == list(d)
+    for lc in d:
+        assert dict(compact[lc]).keys() == d[lc].keys()
+        for key in d[lc]:
+            np.testing.assert_array_equal(compact[lc][key], d[lc][key])
+
+    # The known points are shared instead of copied for every load case
+    assert all(compact[lc]['Y'] is compact.y_known for lc in compact)
+    assert compact.nbytes < sum(arr.nbytes for lc in d for arr in
+                                [d[lc]['X'], d[lc]['Y'], d[lc]['Z']])
+    with pytest.raises(ValueError):
+        compact[124]['Z'][0] = 1
+
+    # Settlements are changed through the view, other keys are fixed
+    z = d[124]['Z'] * 2
+    compact[124]['Z'] = z
+    np.testing.assert_array_equal(compact[124]['Z'], z)
+    with pytest.raises(KeyError):
+        compact[124]['X'] = z
+
+    unpickled = pickle.loads(pickle.dumps(compact))
+    np.testing.assert_array_equal(unpickled[124]['Z'], z)
+    for lc, data in compact.to_dict().items():
+        np.testing.assert_array_equal(data['Z'], compact[lc]['Z'])
+
+    # A run with the set writes the same files as with the dictionary
+    write_node_file(tmp_path, n=200)
+    compact[124]['Z'] = d[124]['Z']
+    outputs = []
+    for master_dict in [d, compact]:
+        sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                            dir_target=str(tmp_path), plot_results=False,
+                            report_json=False, incremental=False)
+        outputs.append([(tmp_path / f'settlement_LC{lc}.dat').read_text()
+                        for lc in d])
+    assert outputs[0] == outputs[1]
+
+
+def test_node_filter(tmp_path, capsys):
+    x_known, y_known, _ = known_field()
+    x, y = node_field()
+    z = np.linspace(-10, 10, len(x))
+    master_dict = known_load_cases([1, 2])
+
+    assert (sofset.NodeFilter(z_max=0).mask(x, y, z) == (z < 0)).all()
+    bbox = sofset.NodeFilter(bbox=(6900, -10, 7000, 10)).mask(x, y, z)
+    assert (bbox == ((x >= 6900) & (x <= 7000) & (abs(y) <= 10))).all()
+    square = [(6900, -10), (7000, -10), (7000, 10), (6900, 10)]
+    polygon = sofset.NodeFilter(polygon=square).mask(x, y, z)
+    assert (polygon == bbox).all()
+    triangle = sofset.NodeFilter(polygon=[(6800, 0), (7300, 0), (6800, 30)])
+    expected = (x > 6800) & (y > 0) & (y < 30 - 30 * (x - 6800) / 500)
+    assert (triangle.mask(x, y, z) == expected).all()
+
+    # Nodes outside the hull of the known points are the NaN ones
+    within = sofset.NodeFilter(master_dict=master_dict).mask(x, y, z)
+    settlements = sofset.interpolate_settlements2D(
+        x_known, y_known, master_dict[1]['Z'], x, y, method='linear')
+    assert (within == ~np.isnan(settlements)).all()
+
+    df = write_node_file(tmp_path, n=300)
+    sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                        dir_target=str(tmp_path), plot_results=False,
+                        report_json=False, incremental=False,
+                        z_max=0.5, within_known=True)
+    lines = open(tmp_path / 'settlement_LC1.dat').read().splitlines()
+    written = [int(line.split()[2]) for line in lines if 'POIN' in line]
+    assert 0 < len(written) < (df['Z [m]'] < 0.5).sum()
+    assert set(written) <= set(df['NR'][df['Z [m]'] < 0.5])
+    assert 'nan' not in ''.join(lines)
+    assert capsys.readouterr().out.count('interpolated successfully') == 2
+
+
+def test_write_datfile_precision_and_nan(tmp_path):
+    file_name = sofset.write_datfile(7, 'Test', np.array([1, 2, 3]),
+                                     np.array([-1.23456, np.nan, 2.0]),
+                                     dir_target=str(tmp_path))
+    lines = open(file_name).read().splitlines()
+    assert lines[0] == '+PROG SOFILOAD  $ Plaxis settlement LC7'
+    assert lines[-4:] == ['  POIN NODE 1 WIDE 0 TYPE WZZ -1.23456 ',
+                          '  POIN NODE 2 WIDE 0 TYPE WZZ nan ',
+                          '  POIN NODE 3 WIDE 0 TYPE WZZ 2.0 ',
+                          'END']
+
+    sofset.write_datfile(7, 'Test', np.array([1, 2, 3]),
+                         np.array([-1.23456, np.nan, 2.0]),
+                         dir_target=str(tmp_path), precision=2, skip_nan=True)
+    lines = open(file_name).read().splitlines()
+    assert lines[-3:] == ['  POIN NODE 1 WIDE 0 TYPE WZZ -1.23 ',
+                          '  POIN NODE 3 WIDE 0 TYPE WZZ 2.00 ',
+                          'END']
+
+
+def test_nan_diagnostics(tmp_path, capsys):
+    # Nodes along the alignment, failing beyond both ends of the known points
+    x = np.linspace(6700, 7400, 2000)
+    y = np.tile([-5.0, 5.0], 1000)
+    settlements = np.where((x < 6800) | (x > 7300), np.nan, -1.0)
+    node_no = np.arange(1, len(x) + 1)
+
+    diagnostics = sofset.nan_diagnostics(x, y, settlements)
+    failed = np.isnan(settlements)
+    assert diagnostics['n_nan'] == failed.sum()
+    assert diagnostics['bbox'] == (6700, -5, 7400, 5)
+    assert [region['n_nodes'] for region in diagnostics['regions']] == [
+        (x < 6800).sum(), (x > 7300).sum()]
+    assert diagnostics['regions'][0]['bbox'][:3] == (6700, -5, x[x < 6800].max())
+
+    # Each failed node is its own region when they are far apart
+    diagnostics = sofset.nan_diagnostics(x, y, settlements,
+                                         cluster_distance=1e-3)
+    assert len(diagnostics['regions']) == failed.sum()
+
+    n_nan = sofset.report_load_case(5, x, y, node_no, settlements,
+                                    dir_target=str(tmp_path))
+    assert n_nan == failed.sum()
+    out = capsys.readouterr().out
+    assert 'form 2 region(s)' in out and len(out.splitlines()) < 40
+    nan_nodes = np.loadtxt(tmp_path / 'nan_nodes_LC5.csv', delimiter=',',
+                           skiprows=1)
+    np.testing.assert_array_equal(nan_nodes[:, 0], node_no[failed])
+    np.testing.assert_array_equal(nan_nodes[:, 1], x[failed])
+
+    # The list is removed once all nodes interpolate
+    sofset.report_load_case(5, x, y, node_no, np.zeros_like(x),
+                            dir_target=str(tmp_path))
+    assert not os.path.exists(tmp_path / 'nan_nodes_LC5.csv')
+
+
+def test_combined_datfile(tmp_path, capsys):
+    lines = sofset.format_poin_lines(
+        [1, 2, 3, 4, 6, 7, 8], [0.0, -1.0, -1.001, -1.0, -1.0, 1e-9, -2.0],
+        precision=2, zero_tol=1e-6, collapse=True).splitlines()
+    assert lines == ['  POIN NODE (2 4 1) WIDE 0 TYPE WZZ -1.00 ',
+                     '  POIN NODE 6 WIDE 0 TYPE WZZ -1.00 ',
+                     '  POIN NODE 8 WIDE 0 TYPE WZZ -2.00 ']
+
+    master_dict = write_model(tmp_path, [1, 2])
+    sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                        dir_target=str(tmp_path), plot_results=False,
+                        report_json=False, incremental=False)
+    sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                        dir_target=str(tmp_path), plot_results=False,
+                        report_json=False, incremental=False,
+                        combined_datfile=True, dat_compress=True)
+
+    with gzip.open(tmp_path / 'settlements_combined.dat.gz', 'rt') as file:
+        combined = file.read()
+    assert combined.count('+PROG SOFILOAD') == 1
+    assert combined.endswith('END')
+    for lc in master_dict:
+        # Each load case block matches the separate dat file
+        separate = (tmp_path / f'settlement_LC{lc}.dat').read_text()
+        block = separate[separate.index('\nLC ') + 1:-len('END')]
+        assert block in combined
+
+
+@pytest.mark.parametrize('dat_compress', [False, True])
+def test_combined_datfile_incremental(tmp_path, monkeypatch, capsys,
+                                      dat_compress):
+    master_dict = write_model(tmp_path, [1, 2])
+    # Relative target directory, as when run from the model folder
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('out')
+
+    def run():
+        report = sofset.run_analysis(
+            master_dict, dir_lookup=str(tmp_path), dir_target='out',
+            plot_results=False, report_json=False, combined_datfile=True,
+            dat_compress=dat_compress)
+        capsys.readouterr()
+        return [r['load_case'] for r in report.records
+                if r['stage'] == 'status_report']
+
+    assert run() == [1, 2]
+    assert run() == []
+    name = 'settlements_combined.dat' + ('.gz' if dat_compress else '')
+    with open('out/sofset_manifest.json') as file:
+        outputs = json.load(file)['load_cases']['1']['outputs']
+    assert list(outputs) == [str(tmp_path / 'out' / name)]
+
+    # The combined file is rewritten with all load cases if one changes
+    master_dict[2]['Z'] = master_dict[2]['Z'] * 2
+    assert run() == [1, 2]
+
+
+def test_run_analysis_parallel_matches_serial(tmp_path, capsys):
+    master_dict = write_model(tmp_path, [3, 1, 2],
+                              ['2D (X,Y)-variation - Cubic',
+                               '2D (X,Y)-variation - Linear',
+                               '1D (X)-variation - Linear'], n=500)
+
+    outputs = {}
+    for workers in [1, 2]:
+        dir_target = tmp_path / f'workers{workers}'
+        dir_target.mkdir()
+        sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                            dir_target=str(dir_target), plot_results=False,
+                            workers=workers, report_json=False,
+                            incremental=False)
+        files = {f: (dir_target / f).read_text()
+                 for f in sorted(os.listdir(dir_target))}
+        outputs[workers] = (files, capsys.readouterr().out)
+
+    assert [f for f in outputs[1][0] if f.endswith('.dat')] == [
+        'settlement_LC1.dat', 'settlement_LC2.dat', 'settlement_LC3.dat']
+    assert outputs[1] == outputs[2]
+
+
+def test_streaming_matches_in_memory(tmp_path, capsys):
+    master_dict = write_model(tmp_path, [1, 2],
+                              ['2D (X,Y)-variation - Cubic',
+                               '1D (X)-variation - Linear'], n=500)
+
+    chunks = list(sofset.iter_excel_nodes(dir_lookup=str(tmp_path),
+                                          chunk_size=200))
+    assert [len(chunk[0]) for chunk in chunks] == [200, 200, 100]
+    np.testing.assert_array_equal(
+        np.concatenate([chunk[3] for chunk in chunks]),
+        sofset.load_nodes(dir_lookup=str(tmp_path))[3])
+
+    outputs = {}
+    for chunk_size in [None, 200]:
+        dir_target = tmp_path / f'chunk{chunk_size}'
+        dir_target.mkdir()
+        sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                            dir_target=str(dir_target), plot_results=False,
+                            chunk_size=chunk_size, report_json=False,
+                            incremental=False)
+        # Compare sorted lines, as 1D load cases may order nodes differently
+        outputs[chunk_size] = {
+            f: sorted((dir_target / f).read_text().splitlines())
+            for f in os.listdir(dir_target)}
+        report = capsys.readouterr().out
+        assert report.count('Number of nan values') == 2
+
+        # The cached interpolators keep no located nodes after the run
+        for interpolator in sofset.interpolator_cache._interpolators.values():
+            assert getattr(interpolator, 'xi', None) is None
+            assert getattr(interpolator, 'x', None) is None
+
+    assert outputs[None] == outputs[200]
+
+
+def test_streaming_without_nodes(tmp_path, capsys):
+    # The filter leaves no nodes, so no chunk reaches the interpolation
+    master_dict = write_model(tmp_path, [1, 2])
+    outputs = {}
+    for chunk_size in [None, 100]:
+        dir_target = tmp_path / f'chunk{chunk_size}'
+        dir_target.mkdir()
+        sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                            dir_target=str(dir_target),
+                            png_targetdir=str(dir_target),
+                            chunk_size=chunk_size, report_json=False,
+                            z_max=-100)
+        outputs[chunk_size] = {f: (dir_target / f).read_bytes()
+                               for f in os.listdir(dir_target)
+                               if f.endswith('.dat')}
+        assert capsys.readouterr().out.count('interpolated successfully') == 2
+
+    assert 'POIN' not in outputs[100]['settlement_LC1.dat'].decode()
+    assert outputs[None] == outputs[100]
+
+
+def test_streaming_sample_is_bounded(tmp_path, capsys, monkeypatch):
+    master_dict = known_load_cases([1, 2])
+    x, y = node_field(n=20000)
+    node_no = np.arange(1, len(x) + 1)
+    chunks = [(x[i:i + 1000], y[i:i + 1000], None, node_no[i:i + 1000])
+              for i in range(0, len(x), 1000)]
+    expected = sofset.interpolate_load_cases(master_dict, x, y)
+
+    sampled = []
+    monkeypatch.setattr(sofset.SettlementPlotter, 'plot',
+                        lambda self, xy, node_no, lc, d, settlements, **kw:
+                        sampled.append(settlements))
+    report = sofset.RunReport()
+    with report:
+        sofset.run_load_cases_streaming(master_dict, chunks,
+                                        dir_target=str(tmp_path),
+                                        plot_max_points=500)
+    capsys.readouterr()
+
+    n_nan = {r['load_case']: r['n_nan'] for r in report.records
+             if r['stage'] == 'status_report'}
+    for lc, settlements in zip(master_dict, sampled):
+        is_nan = np.isnan(expected[lc])
+        assert 1000 < is_nan.sum() < len(x) - 1000
+        # At most the budget of valid and of failed nodes is kept
+        assert 250 < (~np.isnan(settlements)).sum() <= 500
+        assert 250 < np.isnan(settlements).sum() <= 500
+
+        # The counts and the list of failed nodes are complete
+        assert n_nan[lc] == is_nan.sum()
+        nan_nodes = np.loadtxt(tmp_path / f'nan_nodes_LC{lc}.csv',
+                               delimiter=',', skiprows=1)
+        np.testing.assert_array_equal(nan_nodes[:, 0], node_no[is_nan])
+
+
+def test_run_report_records_stages(tmp_path, capsys):
+    master_dict = write_model(tmp_path, [1, 2],
+                              ['2D (X,Y)-variation - Cubic',
+                               '1D (X)-variation - Linear'])
+    sofset.clear_node_cache()
+
+    records = []
+    sofset.add_stage_hook(records.append)
+    try:
+        report = sofset.run_analysis(
+            master_dict, dir_lookup=str(tmp_path), dir_target=str(tmp_path),
+            plot_results=False, print_timings=True)
+    finally:
+        sofset.remove_stage_hook(records.append)
+
+    assert records == report.records
+    stages = [record['stage'] for record in report.records]
+    assert stages[-1] == 'run_analysis'
+    assert {'read_excel_nodes', 'interpolation', 'status_report',
+            'write_datfile'} <= set(stages)
+    writes = [r for r in report.records if r['stage'] == 'write_datfile']
+    assert [(r['load_case'], r['n_nodes']) for r in writes] == [(1, 300),
+                                                                (2, 300)]
+    assert all(r['wall_time'] >= 0 for r in report.records)
+    if sys.platform.startswith('linux'):
+        # Memory of the stage itself next to the peak of the whole process
+        assert all(r['rss'] > 0 and r['process_peak_rss'] > 0
+                   and isinstance(r['rss_change'], int)
+                   for r in report.records)
+
+    with open(tmp_path / 'sofset_run_report.json') as file:
+        saved = json.load(file)
+    assert saved['load_cases'] == [1, 2]
+    assert [r['stage'] for r in saved['stages']] == stages
+    assert 'Run report' in capsys.readouterr().out
+
+
+def test_incremental_run_skips_unchanged_load_cases(tmp_path, capsys):
+    master_dict = write_model(tmp_path, [1, 2, 3], n=200)
+
+    def run():
+        report = sofset.run_analysis(
+            master_dict, dir_lookup=str(tmp_path), dir_target=str(tmp_path),
+            plot_results=False, report_json=False)
+        capsys.readouterr()
+        return [r['load_case'] for r in report.records
+                if r['stage'] == 'write_datfile']
+
+    assert run() == [1, 2, 3]
+    assert run() == []
+
+    # Changing the settlements of one load case only reruns that one
+    master_dict[2]['Z'] = master_dict[2]['Z'] * 2
+    assert run() == [2]
+
+    # So does a deleted output file, while other options rerun everything
+    os.remove(tmp_path / 'settlement_LC3.dat')
+    assert run() == [3]
+    sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                        dir_target=str(tmp_path), plot_results=False,
+                        report_json=False, dat_precision=3)
+    assert capsys.readouterr().out.count('Number of nan values') == 3
+
+    # As does a changed node file
+    write_node_file(tmp_path, n=210)
+    assert run() == [1, 2, 3]
+
+
+def test_incremental_run_within_known(tmp_path, capsys):
+    master_dict = write_model(tmp_path, [1, 2])
+
+    def run(incremental=True):
+        report = sofset.run_analysis(
+            master_dict, dir_lookup=str(tmp_path), dir_target=str(tmp_path),
+            plot_results=False, report_json=False, within_known=True,
+            incremental=incremental)
+        capsys.readouterr()
+        return [r['load_case'] for r in report.records
+                if r['stage'] == 'write_datfile']
+
+    assert run() == [1, 2]
+    assert run() == []
+
+    # Widening the known points of LC2 keeps more nodes for LC1 as well
+    for key in ['X', 'Y']:
+        coords = master_dict[2][key]
+        master_dict[2][key] = coords.mean() + 1.5 * (coords - coords.mean())
+    assert run() == [1, 2]
+    incremental = (tmp_path / 'settlement_LC1.dat').read_text()
+    run(incremental=False)
+    assert (tmp_path / 'settlement_LC1.dat').read_text() == incremental
+
+
+def test_sweep_matches_interpolating_each_combination(tmp_path, capsys):
+    x_known, y_known, z_known = known_field(n_lc=2)
+    x, y = node_field()
+    master_dict = known_load_cases([1, 2], ['2D (X,Y)-variation - Cubic',
+                                            '1D (X)-variation - Cubic'])
+    combinations = sofset.scaled_combinations(1, [0.5, 1.5], first_lc=101)
+    combinations[103] = {'title': 'Sum', 'factors': {1: 1.0, 2: -2.0}}
+    assert combinations[101] == {'title': '0.5 x LC1', 'factors': {1: 0.5}}
+
+    results = sofset.sweep_load_cases(master_dict, combinations, x, y)
+
+    assert list(results) == [101, 102, 103]
+    # Scaled load cases equal interpolating the scaled known settlements
+    for lc, scale in zip([101, 102], [0.5, 1.5]):
+        expected = sofset.interpolate_settlements2D(
+            x_known, y_known, scale * z_known[0], x, y)
+        np.testing.assert_allclose(results[lc], expected, equal_nan=True,
+                                   atol=1e-9)
+
+    # Combining a 2D and a 1D load case, nan where either is nan
+    base = sofset.interpolate_load_cases(master_dict, x, y)
+    np.testing.assert_allclose(results[103], base[1] - 2 * base[2],
+                               equal_nan=True, atol=1e-9)
+    assert (np.isnan(results[103])
+            == np.isnan(base[1]) | np.isnan(base[2])).all()
+
+    write_node_file(tmp_path, n=100)
+    file_names = sofset.run_sweep(master_dict, combinations,
+                                  dir_lookup=str(tmp_path),
+                                  dir_target=str(tmp_path))
+    assert [os.path.basename(f) for f in file_names] == [
+        'settlement_LC101.dat', 'settlement_LC102.dat', 'settlement_LC103.dat']
+    assert "titl '1.5 x LC1'" in open(file_names[1]).read()
+    assert capsys.readouterr().out.count('    LC10') == 3
+
+    # All combined load cases in one SOFILOAD block
+    file_names = sofset.run_sweep(master_dict, combinations,
+                                  dir_lookup=str(tmp_path),
+                                  dir_target=str(tmp_path),
+                                  combined_datfile=True, output_workers=2)
+    assert [os.path.basename(f) for f in file_names] == [
+        'settlements_combined.dat']
+    text = open(file_names[0]).read()
+    assert text.count('+PROG SOFILOAD') == 1
+    assert text.count("titl '") == 3 and text.endswith('END')
+
+
+def test_output_pipeline_reports_errors(tmp_path, capsys, monkeypatch):
+    import threading
+    started, release = threading.Event(), threading.Event()
+    done = []
+
+    # The queue holds one job while the writer thread is blocked, so the
+    # third submission waits until the writer is released
+    with sofset.OutputPipeline(workers=1, maxsize=1) as output:
+        output.submit('block', lambda: started.set() or release.wait())
+        started.wait()
+        output.submit('first', done.append, 1)
+        submitter = threading.Thread(
+            target=output.submit, args=('second', done.append, 2))
+        submitter.start()
+        submitter.join(timeout=0.2)
+        assert submitter.is_alive() and done == []
+        release.set()
+        submitter.join()
+    assert done == [1, 2] and output.errors == []
+
+    master_dict = write_model(tmp_path, [1, 2, 3], n=100)
+    write_datfile = sofset.write_datfile
+
+    def failing_write(lc, *args, **kwargs):
+        if lc == 2:
+            raise OSError('Network share unavailable')
+        return write_datfile(lc, *args, **kwargs)
+
+    monkeypatch.setattr(sofset, 'write_datfile', failing_write)
+    with pytest.raises(RuntimeError, match='LC2 write_datfile'):
+        sofset.run_analysis(master_dict, dir_lookup=str(tmp_path),
+                            dir_target=str(tmp_path), plot_results=False,
+                            report_json=False)
+
+    assert 'LC2 write_datfile: OSError: Network share unavailable' in \
+        capsys.readouterr().out
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith('.dat')) == [
+        'settlement_LC1.dat', 'settlement_LC3.dat']
+    assert not os.path.exists(tmp_path / 'sofset_manifest.json')
+
+
+def test_command_line_batch(tmp_path, capsys):
+    import shutil
+    for model in ['model_a', 'model_b', 'other']:
+        os.makedirs(tmp_path / model / 'Settlement_interpolation')
+        shutil.copy(TESTDATA, tmp_path / model / sofset.DEFAULT_INPUT)
+        df = write_node_file(tmp_path / model, n=100)
+    # Nodes of model_b are outside the known points
+    df['X [m]'] += 1000
+    for model in ['model_a', 'other']:
+        # Keep the nodes of the other models well inside the known points
+        df_inside = df.assign(**{'X [m]': np.linspace(6850, 7250, len(df)),
+                                 'Y [m]': np.linspace(-10, 10, len(df))})
+        df_inside.to_excel(tmp_path / model / 'nodes_to_be_interpolated.xlsx',
+                           sheet_name='XLSX-Export', index=False)
+    df.to_excel(tmp_path / 'model_b' / 'nodes_to_be_interpolated.xlsx',
+                sheet_name='XLSX-Export', index=False)
+
+    pattern = str(tmp_path / 'model_*')
+    assert sofset.main([pattern, '--no-plots', '-j', '2']) == 1
+    out = capsys.readouterr().out
+    assert 'ok' in out.splitlines()[1] and 'model_a' in out
+    assert 'nan in LC 125, 124, 126, 127' in out.splitlines()[2]
+    assert (tmp_path / 'model_a' / 'settlement_LC124.dat').exists()
+    assert 'LC125' in (tmp_path / 'model_b' / 'sofset_log.txt').read_text()
+
+    # Unchanged load cases keep their nan count when skipped
+    assert sofset.main([pattern, '--no-plots', '-j', '1']) == 1
+    assert 'nan in LC 125' in capsys.readouterr().out
+
+    assert sofset.main([str(tmp_path / 'other'), '--no-plots']) == 0
+    os.remove(tmp_path / 'other' / sofset.DEFAULT_INPUT)
+    assert sofset.main([str(tmp_path / 'other'), '--no-plots']) == 2
+    assert 'FAILED' in capsys.readouterr().out
+
+
+def test_plot_sample_keeps_nan_points():
+    settlements = np.arange(1000, dtype=float)
+    settlements[[3, 500, 999]] = np.nan
+
+    idx = sofset.plot_sample(settlements, max_points=100)
+
+    assert len(idx) == 103
+    assert {3, 500, 999} <= set(idx)
+    np.testing.assert_array_equal(sofset.plot_sample(settlements),
+                                  np.arange(1000))
+
+
+def test_plotter_reuses_figures(tmp_path):
+    pytest.importorskip('matplotlib')
+    x_known, y_known, z_known = known_field()
+    x, y = node_field()
+    master_dict = known_load_cases(range(4), ['2D (X,Y)-variation - Linear',
+                                              '1D (X)-variation - Linear'] * 2)
+    settlements = sofset.interpolate_settlements2D(
+        x_known, y_known, z_known[0], x, y, method='linear')
+
+    with sofset.SettlementPlotter(workers=0, max_points=200) as plotter:
+        for lc in master_dict:
+            plotter.plot((x, y), np.arange(len(x)), lc, master_dict,
+                         settlements, png_targetdir=str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        f'LC{lc}_settl_interp_plot.png' for lc in range(4)]
+    assert len(sofset._plot_axes_cache.axes) == 2
+
+
+def test_import_time():
+    # Upper bound on the import cost of the core interpolation API, which
+    # should not pull in SciPy, pandas or matplotlib
+    max_seconds = float(os.environ.get('SOFSET_MAX_IMPORT_SECONDS', 1.0))
+    code = (
+        'import sys, time\n'
+        f'sys.path.insert(0, {os.path.dirname(sofset.__file__)!r})\n'
+        'start = time.perf_counter()\n'
+        'from sofset import Interpolator2D, run_analysis\n'
+        'print(time.perf_counter() - start)\n'
+        'print(*[m for m in ("scipy", "pandas", "matplotlib", "openpyxl")\n'
+        '        if m in sys.modules])\n')
+
+    # Best of three runs to reduce noise from a cold disk cache
+    runs = [subprocess.run([sys.executable, '-c', code], capture_output=True,
+                           text=True, check=True).stdout.splitlines()
+            for _ in range(3)]
+
+    assert min(float(run[0]) for run in runs) < max_seconds
+    assert runs[0][1] == ''
+
 
 if __name__ == '__main__':
     # Set path to Excel file for the input settlement field